@@ -1,9 +1,16 @@
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "aa_restaurant.settings")
+os.environ.setdefault("ASYNC_VIEWS", "1")
+os.environ["DJANGO_ASGI"] = "1"
 
 application = get_asgi_application()
 
+if settings.STATIC_BUILD:
+    from restaurant.static_handler import StaticFilesASGI
+
+    application = StaticFilesASGI(application)
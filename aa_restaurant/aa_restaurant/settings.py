@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import tempfile
 
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -23,6 +24,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
+    "restaurant.middleware.ReplicaStickinessMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
@@ -49,18 +51,64 @@ TEMPLATES = [
     },
 ]
 
+# Opt-in per-request instrumentation (restaurant/metrics.py): Server-Timing
+# headers on every response and Prometheus text at /metrics/.
+REQUEST_METRICS = os.getenv("REQUEST_METRICS", "0") == "1"
+# Bearer token for scraping /metrics/; without one only staff can read it.
+REQUEST_METRICS_TOKEN = os.getenv("REQUEST_METRICS_TOKEN", "")
+# What @query_budget does when a view runs more queries than it declares:
+# "warn" (log), "raise" (QueryBudgetExceeded, for tests) or "off".
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "warn")
+# Route the menu and cart JSON API to their native async views. asgi.py turns
+# it on; under WSGI the sync views avoid an async_to_sync hop per request.
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "0") == "1"
+# Persistent connections (CONN_MAX_AGE) are off under ASGI, whatever
+# DB_CONN_MAX_AGE says: the ORM runs on sync_to_async executor threads there,
+# which Django's per-request connection cleanup never visits, so connections
+# pile up open instead of being reused. asgi.py sets DJANGO_ASGI.
+PERSISTENT_CONNECTIONS = not ASYNC_VIEWS and os.getenv("DJANGO_ASGI", "0") != "1"
+if REQUEST_METRICS:
+    MIDDLEWARE.insert(0, "restaurant.metrics.RequestMetricsMiddleware")
+    TEMPLATES[0]["BACKEND"] = "restaurant.metrics.InstrumentedDjangoTemplates"
+
 WSGI_APPLICATION = "aa_restaurant.wsgi.application"
 ASGI_APPLICATION = "aa_restaurant.asgi.application"
 
 USE_SQLITE = os.getenv("USE_SQLITE", "1") == "1"
 
+# SQLite profile: "tuned" (WAL, busy timeout, persistent connections) or
+# "default" (Django's stock settings: rollback journal, a new connection per request).
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "tuned")
+SQLITE_PRAGMAS = {}
+
 if USE_SQLITE:
     DATABASES = {
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
-            "NAME": BASE_DIR / "db.sqlite3",
+            "NAME": os.getenv("SQLITE_PATH", BASE_DIR / "db.sqlite3"),
         }
     }
+    if SQLITE_PROFILE == "tuned":
+        DATABASES["default"].update(
+            {
+                "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "600")) if PERSISTENT_CONNECTIONS else 0,
+                "CONN_HEALTH_CHECKS": True,
+                "OPTIONS": {
+                    # Seconds to wait on a locked database before raising.
+                    "timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT", "20")),
+                    # Take the write lock at BEGIN so writers queue on the busy
+                    # timeout instead of failing when a read lock is upgraded.
+                    "transaction_mode": "IMMEDIATE",
+                },
+            }
+        )
+        # Applied to every new connection by restaurant.signals.apply_sqlite_pragmas.
+        SQLITE_PRAGMAS = {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(128 * 1024 * 1024))),
+            "temp_store": "MEMORY",
+        }
 else:
     DATABASES = {
         "default": {
@@ -70,8 +118,71 @@ else:
             "PASSWORD": os.getenv("DB_PASSWORD", ""),
             "HOST": os.getenv("DB_HOST", "127.0.0.1"),
             "PORT": os.getenv("DB_PORT", "3306"),
+            "CONN_HEALTH_CHECKS": True,
         }
     }
+    if os.getenv("MYSQL_POOL", "0") == "1":
+        # Connections go back to a per-process pool at the end of each request
+        # instead of being closed, so requests skip the TCP + auth handshake.
+        # Off by default until it has been run against a real MySQL server.
+        DATABASES["default"].update(
+            {
+                "ENGINE": "restaurant.backends.mysql_pooled",
+                "OPTIONS": {
+                    "pool": {
+                        "max_size": int(os.getenv("MYSQL_POOL_SIZE", "10")),
+                        "max_age": int(os.getenv("MYSQL_POOL_MAX_AGE", "1800")),
+                        "max_idle": int(os.getenv("MYSQL_POOL_MAX_IDLE", "30")),
+                    },
+                },
+            }
+        )
+    else:
+        DATABASES["default"]["CONN_MAX_AGE"] = int(os.getenv("DB_CONN_MAX_AGE", "0")) if PERSISTENT_CONNECTIONS else 0
+
+# Optional read replica: a second SQLite file (USE_SQLITE=1) or a MySQL host.
+# Menu/category reads and dashboard reports go there; a visitor who just wrote
+# (e.g. checked out) reads from the primary for REPLICA_STICKY_SECONDS.
+DB_REPLICA = os.getenv("DB_REPLICA", "")
+DATABASE_REPLICA_ALIAS = None
+if DB_REPLICA:
+    DATABASE_REPLICA_ALIAS = "replica"
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        ("NAME" if USE_SQLITE else "HOST"): DB_REPLICA,
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_ROUTERS = ["restaurant.routers.ReplicaRouter"]
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Session store shared by every worker on this host. Swap the backend for
+    # Redis/Memcached when running on more than one machine.
+    "sessions": {
+        "BACKEND": os.getenv("SESSION_CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"),
+        "LOCATION": os.getenv("SESSION_CACHE_LOCATION", os.path.join(tempfile.gettempdir(), "aa_restaurant_sessions")),
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv("SESSION_CACHE_MAX_ENTRIES", "50000"))},
+    },
+}
+
+# Session tier: "db" (django_session only), "cached_db" (reads from the
+# sessions cache, writes through to the DB), "cache" (sessions cache only) or
+# "signed_cookies" (no server storage; the cart travels in the cookie).
+# Customers reach their orders only through the session's order_ids, so the
+# default keeps sessions in the DB; "cache" loses them when the cache culls.
+SESSION_TIER = os.getenv("SESSION_TIER", "cached_db")
+SESSION_ENGINES = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "cache": "django.contrib.sessions.backends.cache",
+    "signed_cookies": "django.contrib.sessions.backends.signed_cookies",
+}
+SESSION_ENGINE = SESSION_ENGINES[SESSION_TIER]
+SESSION_CACHE_ALIAS = "sessions"
 
 
 AUTH_PASSWORD_VALIDATORS = []
@@ -83,8 +194,56 @@ USE_TZ = True
 
 STATIC_URL = "/static/"
 STATICFILES_DIRS = [BASE_DIR / "static"]
+STATIC_ROOT = Path(os.getenv("STATIC_ROOT", BASE_DIR / "staticfiles"))
+
+# Static build mode: `collectstatic` writes content-hashed names plus .gz/.br
+# copies, and wsgi.py/asgi.py serve them with far-future immutable headers.
+STATIC_BUILD = os.getenv("STATIC_BUILD", "0") == "1"
+
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": (
+            "restaurant.storage.CompressedManifestStaticFilesStorage"
+            if STATIC_BUILD
+            else "django.contrib.staticfiles.storage.StaticFilesStorage"
+        ),
+    },
+}
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Widths (px) of the WebP/JPEG variants generated for menu item images.
+MENU_THUMBNAIL_WIDTHS = (320, 640, 960)
+
+MENU_WARMUP_ON_MIGRATE = os.getenv("MENU_WARMUP_ON_MIGRATE", "1") == "1"
+# Creates the test databases with a throwaway MEDIA_ROOT (see the warm-up above).
+TEST_RUNNER = "restaurant.test_runner.TestRunner"
+
+# Where the menu version lives: "db" (a one-row table, works with
+# per-process caches) or "cache" (only with a cache shared by every process;
+# refused with the default LocMemCache, see restaurant/checks.py).
+MENU_VERSION_STORE = os.getenv("MENU_VERSION_STORE", "db")
+# Seconds a worker may reuse the last version it read before checking again.
+# With 0 every menu/cart request reads the version; a few seconds keeps cached
+# pages off the database while other workers still see edits almost at once.
+MENU_VERSION_CHECK_INTERVAL = float(os.getenv("MENU_VERSION_CHECK_INTERVAL", "2"))
+
+PAYMENT_OTP_TTL_SECONDS = int(os.getenv("PAYMENT_OTP_TTL_SECONDS", "600"))
+# Codes issued per checkout (first code plus resends and retries).
+PAYMENT_OTP_MAX_ISSUES = int(os.getenv("PAYMENT_OTP_MAX_ISSUES", "5"))
+# Demo mode: there is no SMS gateway, so the issued OTP is returned to the browser.
+PAYMENT_OTP_DEMO = os.getenv("PAYMENT_OTP_DEMO", "1" if DEBUG else "0") == "1"
+
+ORDER_ID_GENERATOR = os.getenv("ORDER_ID_GENERATOR", "restaurant.order_ids.TimeOrderedOrderIdGenerator")
+# Give each host running the app a different node number (0-13).
+ORDER_ID_NODE = int(os.getenv("ORDER_ID_NODE", "0"))
+
+# Pub/sub behind the /events/ stream (restaurant/events.py). The in-process
+# broker only reaches clients connected to the same worker process.
+EVENT_BROKER = os.getenv("EVENT_BROKER", "restaurant.events.InProcessBroker")
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
@@ -1,5 +1,6 @@
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 
@@ -7,3 +8,7 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "aa_restaurant.settings")
 
 application = get_wsgi_application()
 
+if settings.STATIC_BUILD:
+    from restaurant.static_handler import StaticFilesWSGI
+
+    application = StaticFilesWSGI(application)
@@ -6,6 +6,7 @@ from .models import (
     OrderItem,
     PaymentOTP,
     ContactMessage,
+    defer_order_totals,
 )
 
 
@@ -29,6 +30,7 @@ class MenuItemAdmin(admin.ModelAdmin):
     )
     list_filter = ("category", "is_popular", "is_available")
     search_fields = ("name", "description")
+    ordering = ("category", "name")
 
 
 class OrderItemInline(admin.TabularInline):
@@ -49,9 +51,15 @@ class OrderAdmin(admin.ModelAdmin):
         "created_at",
     )
     list_filter = ("status", "payment_status", "payment_method")
+    ordering = ("-created_at",)
     search_fields = ("order_id", "customer_name", "customer_email", "customer_phone", "address")
     inlines = [OrderItemInline]
 
+    def save_related(self, request, form, formsets, change):
+        with defer_order_totals() as pending:
+            super().save_related(request, form, formsets, change)
+            pending.setdefault(form.instance.pk, form.instance)
+
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
@@ -1,7 +1,22 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.models.signals import post_migrate
+
+
+def _warm_menu_after_migrate(sender, using, plan=None, **kwargs):
+    from .catalog import warm_menu
+
+    if not plan:
+        return
+    warm_menu(using=using)
 
 
 class RestaurantConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "restaurant"
 
+    def ready(self):
+        from . import checks, signals  # noqa: F401
+
+        if getattr(settings, "MENU_WARMUP_ON_MIGRATE", False):
+            post_migrate.connect(_warm_menu_after_migrate, sender=self)
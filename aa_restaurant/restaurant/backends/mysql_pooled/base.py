@@ -0,0 +1,39 @@
+from django.db.backends.mysql.base import DatabaseWrapper as MySQLDatabaseWrapper
+
+from .pool import get_pool
+
+
+class DatabaseWrapper(MySQLDatabaseWrapper):
+    # OPTIONS["pool"] = {"max_size": ..., "max_age": ..., "max_idle": ...};
+    # the remaining OPTIONS go to MySQLdb.connect() as usual.
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict["OPTIONS"].get("pool") or {})
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        kwargs.pop("pool", None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        connection = self.pool.acquire()
+        if connection is None:
+            connection = super().get_new_connection(conn_params)
+            self.pool.add(connection)
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        if self.in_atomic_block or self.errors_occurred:
+            self.pool.discard(self.connection)
+            return
+        try:
+            # Hand the connection back without an open transaction.
+            with self.wrap_database_errors:
+                self.connection.rollback()
+        except Exception:
+            self.pool.discard(self.connection)
+            return
+        self.pool.release(self.connection)
@@ -0,0 +1,93 @@
+import os
+import threading
+import time
+from collections import deque
+
+
+class ConnectionPool:
+    # Idle raw MySQLdb connections shared by all threads of one worker process.
+    # Django still owns a connection while a request uses it; closing it just
+    # hands it back here instead of tearing down the TCP session.
+
+    def __init__(self, max_size, max_age, max_idle):
+        self.max_size = max_size
+        self.max_age = max_age
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle = deque()
+        self._created = {}
+        self._pid = os.getpid()
+
+    def _check_fork(self):
+        # Connections inherited from a parent process must never be reused.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._idle.clear()
+            self._created.clear()
+
+    def _expired(self, connection, now):
+        return self.max_age is not None and now - self._created.get(id(connection), now) >= self.max_age
+
+    def acquire(self):
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                self._check_fork()
+                if not self._idle:
+                    return None
+                connection, released_at = self._idle.pop()
+
+            if self._expired(connection, now):
+                self.discard(connection)
+                continue
+            if self.max_idle is not None and now - released_at >= self.max_idle:
+                # Idle long enough that the server may have dropped it.
+                try:
+                    connection.ping()
+                except Exception:
+                    self.discard(connection)
+                    continue
+            return connection
+
+    def add(self, connection):
+        with self._lock:
+            self._created[id(connection)] = time.monotonic()
+
+    def release(self, connection):
+        now = time.monotonic()
+        with self._lock:
+            self._check_fork()
+            if len(self._idle) < self.max_size and not self._expired(connection, now):
+                self._idle.append((connection, now))
+                return
+        self.discard(connection)
+
+    def discard(self, connection):
+        with self._lock:
+            self._created.pop(id(connection), None)
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for connection, _released_at in idle:
+            self.discard(connection)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, options):
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None:
+            pool = _pools[alias] = ConnectionPool(
+                max_size=int(options.get("max_size", 10)),
+                max_age=options.get("max_age"),
+                max_idle=options.get("max_idle", 30),
+            )
+    return pool
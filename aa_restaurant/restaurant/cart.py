@@ -0,0 +1,31 @@
+def cart_quantity(value):
+    if isinstance(value, dict):
+        value = value.get("quantity", 0)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def count_cart_items(cart):
+    total = 0
+    if isinstance(cart, dict):
+        for value in cart.values():
+            quantity = cart_quantity(value)
+            if quantity > 0:
+                total += quantity
+    return total
+
+
+def session_cart_count(session):
+    count = session.get("cart_count")
+    if isinstance(count, int) and count >= 0:
+        return count
+    return count_cart_items(session.get("cart", {}))
+
+
+async def asession_cart_count(session):
+    count = await session.aget("cart_count")
+    if isinstance(count, int) and count >= 0:
+        return count
+    return count_cart_items(await session.aget("cart", {}))
@@ -0,0 +1,126 @@
+from django.db.models import Q
+
+from .image_index import get_image_index, image_path_for_menu_name
+from .menu_version import bump_menu_version
+from .models import MenuItem
+from .thumbnails import refresh_image_variants
+
+
+SAMPLE_MENU_ITEMS = [
+    {
+        "name": "Paneer Tikka",
+        "category": MenuItem.CATEGORY_STARTERS,
+        "price": 200,
+        "description": "Marinated paneer cubes grilled with spices.",
+        "rating": 4.5,
+        "is_popular": True,
+        "image_url": "https://images.unsplash.com/photo-1604908176997-1251884b08a7",
+        "is_available": True,
+    },
+    {
+        "name": "Veg Manchuria",
+        "category": MenuItem.CATEGORY_STARTERS,
+        "price": 180,
+        "description": "Crispy vegetable balls tossed in tangy sauce.",
+        "rating": 4.3,
+        "is_popular": False,
+        "image_url": "https://images.unsplash.com/photo-1604908176997-1251884b08a7",
+        "is_available": True,
+    },
+    {
+        "name": "Chicken Biryani",
+        "category": MenuItem.CATEGORY_MAIN_COURSE,
+        "price": 260,
+        "description": "Fragrant basmati rice cooked with spiced chicken.",
+        "rating": 4.6,
+        "is_popular": True,
+        "image_url": "https://images.unsplash.com/photo-1604908176997-1251884b08a7",
+        "is_available": True,
+    },
+    {
+        "name": "Veg Fried Rice",
+        "category": MenuItem.CATEGORY_MAIN_COURSE,
+        "price": 220,
+        "description": "Stir fried rice with mixed vegetables and sauces.",
+        "rating": 4.2,
+        "is_popular": False,
+        "image_url": "https://images.unsplash.com/photo-1604908176997-1251884b08a7",
+        "is_available": True,
+    },
+    {
+        "name": "Mango Juice",
+        "category": MenuItem.CATEGORY_BEVERAGES,
+        "price": 90,
+        "description": "Refreshing chilled mango juice.",
+        "rating": 4.4,
+        "is_popular": False,
+        "image_url": "https://images.unsplash.com/photo-1577801596755-03888a34ec6c",
+        "is_available": True,
+    },
+    {
+        "name": "Cool Drink",
+        "category": MenuItem.CATEGORY_BEVERAGES,
+        "price": 60,
+        "description": "Carbonated soft drink served chilled.",
+        "rating": 4.1,
+        "is_popular": False,
+        "image_url": "https://images.unsplash.com/photo-1541976076758-25a71c0b2f2d",
+        "is_available": True,
+    },
+    {
+        "name": "Gulab Jamun",
+        "category": MenuItem.CATEGORY_DESSERTS,
+        "price": 120,
+        "description": "Soft milk dumplings soaked in sugar syrup.",
+        "rating": 4.7,
+        "is_popular": True,
+        "image_url": "https://images.unsplash.com/photo-1606491956689-2ea866880c84",
+        "is_available": True,
+    },
+    {
+        "name": "Ice Cream",
+        "category": MenuItem.CATEGORY_DESSERTS,
+        "price": 100,
+        "description": "Creamy vanilla ice cream scoop.",
+        "rating": 4.3,
+        "is_popular": False,
+        "image_url": "https://images.unsplash.com/photo-1501446529957-6226bd447c46",
+        "is_available": True,
+    },
+]
+
+
+def seed_sample_menu(using="default"):
+    if MenuItem.objects.using(using).exists():
+        return 0
+    created = MenuItem.objects.using(using).bulk_create(
+        [MenuItem(**data) for data in SAMPLE_MENU_ITEMS]
+    )
+    bump_menu_version()
+    return len(created)
+
+
+def reconcile_menu_images(using="default"):
+    if not get_image_index().by_slug:
+        return 0
+
+    missing = MenuItem.objects.using(using).filter(Q(image="") | Q(image__isnull=True))
+    changed = []
+    for item in missing.only("id", "name", "image", "image_variants"):
+        path = image_path_for_menu_name(item.name)
+        if path:
+            item.image = path
+            # bulk_update skips post_save, so build the thumbnails here.
+            refresh_image_variants(item)
+            changed.append(item)
+
+    if changed:
+        MenuItem.objects.using(using).bulk_update(changed, ["image", "image_variants"])
+        bump_menu_version()
+    return len(changed)
+
+
+def warm_menu(using="default", seed=True):
+    seeded = seed_sample_menu(using=using) if seed else 0
+    images = reconcile_menu_images(using=using)
+    return seeded, images
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+
+PER_PROCESS_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+@register(Tags.caches)
+def check_menu_version_store(app_configs, **kwargs):
+    if getattr(settings, "MENU_VERSION_STORE", "db") != "cache":
+        return []
+    backend = settings.CACHES.get("default", {}).get("BACKEND")
+    if backend not in PER_PROCESS_CACHES:
+        return []
+    return [
+        Error(
+            f"MENU_VERSION_STORE='cache' needs a cache shared by every process, not {backend}.",
+            hint=(
+                "Each worker (and manage.py warm_menu / generate_thumbnails) would bump only its own "
+                "copy of the version and keep serving an old menu. Use MENU_VERSION_STORE='db' or "
+                "point CACHES['default'] at Redis/Memcached."
+            ),
+            id="restaurant.E001",
+        )
+    ]
@@ -1,12 +1,12 @@
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from .cart import session_cart_count
+
+
 def cart_count(request):
-    cart = request.session.get("cart", {})
-    total = 0
-    if isinstance(cart, dict):
-        for value in cart.values():
-            try:
-                quantity = int(value.get("quantity", 0))
-            except (AttributeError, TypeError, ValueError):
-                quantity = 0
-            if quantity > 0:
-                total += quantity
-    return {"cart_count": total}
+    return {
+        "cart_count": SimpleLazyObject(lambda: session_cart_count(request.session)),
+        # The badge follows /events/ only where it is served natively (ASGI).
+        "cart_events": settings.ASYNC_VIEWS,
+    }
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+KEEPALIVE_SECONDS = 15
+RETRY_MILLISECONDS = 5000
+
+
+class Subscription:
+    # Read from the event loop that created it; brokers hand messages over
+    # with deliver(), which has to run on that loop.
+
+    def __init__(self, broker, channels, maxsize=100):
+        self.broker = broker
+        self.channels = tuple(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+
+    def deliver(self, message):
+        # A client that stopped reading loses its oldest events, not the newest.
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout=None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class EventBroker:
+    # EVENT_BROKER interface. publish() is called from views, in any thread;
+    # subscribe() from the event stream, on the event loop.
+
+    def publish(self, channel, event, data):
+        raise NotImplementedError
+
+    def subscribe(self, channels):
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+
+class InProcessBroker(EventBroker):
+    # Reaches subscribers in this process only. With several workers, point
+    # EVENT_BROKER at a broker backed by a shared pub/sub (Redis, LISTEN/NOTIFY).
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def publish(self, channel, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, (event, data))
+            except RuntimeError:
+                # Its event loop is closed.
+                self.unsubscribe(subscription)
+        return len(subscribers)
+
+    def subscribe(self, channels):
+        subscription = Subscription(self, channels)
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, "EVENT_BROKER", "restaurant.events.InProcessBroker")
+                _broker = import_string(path)()
+    return _broker
+
+
+def session_channel(session_key):
+    return f"session:{session_key}"
+
+
+def order_channel(order_id):
+    return f"order:{order_id}"
+
+
+def publish_cart_count(session, count):
+    # Before the first save a session has no key, and nobody can be listening.
+    if session.session_key:
+        get_broker().publish(session_channel(session.session_key), "cart", {"cart_count": count})
+
+
+def publish_order_status(order_id, status):
+    get_broker().publish(order_channel(order_id), "order", {"order_id": order_id, "status": status})
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def event_stream(channels, initial=()):
+    subscription = get_broker().subscribe(channels)
+    try:
+        yield f"retry: {RETRY_MILLISECONDS}\n\n"
+        for event, data in initial:
+            yield format_event(event, data)
+        while True:
+            try:
+                event, data = await subscription.get(KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing an idle connection.
+                yield ": keepalive\n\n"
+                continue
+            yield format_event(event, data)
+    finally:
+        subscription.close()
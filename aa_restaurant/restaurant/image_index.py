@@ -0,0 +1,161 @@
+import os
+import threading
+from collections import deque
+
+from django.conf import settings
+
+
+IMAGE_DIRECTORY = "menu_items"
+
+# Extra keywords for photos whose file name is not the dish name.
+IMAGE_NAME_MAP = [
+    ("paneer", "paneer_tikka.jpg"),
+    ("biryani", "chicken_biryani.jpg"),
+    ("mango", "mango_juice.jpg"),
+    ("cool", "cool_drink.jpg"),
+    ("gulab", "gulab_jamun.jpg"),
+    ("ice", "ice_cream.jpg"),
+    ("manchuria", "veg_manchuria.jpg"),
+    ("fried rice", "veg_fried_rice.jpg"),
+    ("chocolate", "chocolate_lava_cake.jpg"),
+]
+
+
+def slugify_name(value):
+    value = (value or "").strip().lower()
+    if not value:
+        return ""
+    parts = []
+    prev_underscore = False
+    for ch in value:
+        if ch.isalnum():
+            parts.append(ch)
+            prev_underscore = False
+        else:
+            if not prev_underscore:
+                parts.append("_")
+                prev_underscore = True
+    return "".join(parts).strip("_")
+
+
+class KeywordAutomaton:
+    # Aho-Corasick: finds every keyword occurring in a text in one pass,
+    # independent of how many keywords there are.
+
+    def __init__(self, keywords):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for keyword, value in keywords:
+            state = 0
+            for ch in keyword:
+                next_state = self._goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][ch] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = next_state
+            self._out[state].append((len(keyword), value))
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(ch, 0)
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+    def matches(self, text):
+        # Yields (end, length, value); the keyword is text[end - length:end].
+        state = 0
+        for end, ch in enumerate(text, start=1):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for length, value in self._out[state]:
+                yield end, length, value
+
+
+class ImageIndex:
+    def __init__(self, mtime, filenames):
+        self.mtime = mtime
+        self.by_slug = {}
+        for name in sorted(filenames):
+            slug = slugify_name(os.path.splitext(name)[0])
+            if slug:
+                self.by_slug.setdefault(slug, name)
+
+        keywords = [(slug, (priority, name)) for priority, (slug, name) in enumerate(self.by_slug.items())]
+        offset = len(keywords)
+        for priority, (keyword, name) in enumerate(IMAGE_NAME_MAP, start=offset):
+            if name in filenames:
+                keywords.append((slugify_name(keyword), (priority, name)))
+        self._automaton = KeywordAutomaton(keywords)
+
+    def match(self, name):
+        slug = slugify_name(name)
+        if not slug:
+            return None
+        exact = self.by_slug.get(slug)
+        if exact:
+            return exact
+        # Only whole "_"-separated words count, so "ice" matches "ice_cream"
+        # but not "orange_juice" or "jeera_rice". Longest keyword wins
+        # ("fried_rice" beats "rice"), then file names before the hand-written keywords.
+        best = None
+        for end, length, (priority, filename) in self._automaton.matches(slug):
+            start = end - length
+            if (start and slug[start - 1] != "_") or (end < len(slug) and slug[end] != "_"):
+                continue
+            key = (-length, priority)
+            if best is None or key < best[0]:
+                best = (key, filename)
+        return best[1] if best else None
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def _directory():
+    media_root = getattr(settings, "MEDIA_ROOT", None)
+    if not media_root:
+        return None
+    return os.path.join(media_root, IMAGE_DIRECTORY)
+
+
+def get_image_index():
+    global _index
+    directory = _directory()
+    try:
+        mtime = (directory, os.stat(directory).st_mtime_ns) if directory else None
+    except OSError:
+        mtime = None
+
+    index = _index
+    if index is not None and index.mtime == mtime:
+        return index
+
+    with _index_lock:
+        index = _index
+        if index is None or index.mtime != mtime:
+            filenames = set()
+            if mtime is not None:
+                filenames = {
+                    entry.name for entry in os.scandir(directory) if entry.is_file() and not entry.name.startswith(".")
+                }
+            index = ImageIndex(mtime, filenames)
+            _index = index
+    return index
+
+
+def image_path_for_menu_name(name):
+    filename = get_image_index().match(name)
+    if filename is None:
+        return None
+    return f"{IMAGE_DIRECTORY}/{filename}"
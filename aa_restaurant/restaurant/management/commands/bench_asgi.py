@@ -0,0 +1,147 @@
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+from restaurant.menu_snapshot import get_menu_snapshot
+
+
+MODES = ("wsgi", "asgi")
+
+
+def _peak_rss():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _clicks(item_id):
+    body = json.dumps({"item_id": item_id})
+    return [
+        ("get", reverse("restaurant:menu"), {}),
+        ("post", reverse("restaurant:cart_increase"), {"data": body, "content_type": "application/json"}),
+        ("get", reverse("restaurant:cart_count_api"), {}),
+        ("post", reverse("restaurant:cart_decrease"), {"data": body, "content_type": "application/json"}),
+    ]
+
+
+def _run_sync_connection(item_id, rounds):
+    client = Client()
+    latencies = []
+    for _ in range(rounds):
+        for method, url, kwargs in _clicks(item_id):
+            started = time.perf_counter()
+            response = getattr(client, method)(url, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                raise CommandError(f"{url} returned {response.status_code}")
+    return latencies
+
+
+async def _run_async_connection(item_id, rounds):
+    client = AsyncClient()
+    latencies = []
+    for _ in range(rounds):
+        for method, url, kwargs in _clicks(item_id):
+            started = time.perf_counter()
+            response = await getattr(client, method)(url, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                raise CommandError(f"{url} returned {response.status_code}")
+    return latencies
+
+
+async def _run_async(item_id, concurrency, rounds):
+    results = await asyncio.gather(*[_run_async_connection(item_id, rounds) for _ in range(concurrency)])
+    return [latency for latencies in results for latency in latencies]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the async cart API and menu on Django's ASGI handler with the sync views on the "
+        "WSGI handler: requests/s, latency and memory per concurrent connection."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64], help="Concurrent connections.")
+        parser.add_argument("--rounds", type=int, default=20, help="menu -> add -> count -> remove rounds per connection.")
+        parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+        parser.add_argument("--worker", choices=MODES, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options["worker"]:
+            return self.run_worker(options["worker"], options["concurrency"][0], options["rounds"])
+
+        if not get_menu_snapshot().available:
+            raise CommandError("No available menu items; run `manage.py warm_menu` first.")
+
+        with tempfile.TemporaryDirectory() as sessions:
+            for concurrency in options["concurrency"]:
+                for mode in options["modes"]:
+                    # A fresh process per run (for a clean peak RSS), serving the
+                    # views each handler is deployed with (asgi.py sets ASYNC_VIEWS).
+                    env = dict(os.environ, SESSION_CACHE_LOCATION=sessions, ASYNC_VIEWS="1" if mode == "asgi" else "0")
+                    command = [
+                        sys.executable,
+                        str(settings.BASE_DIR / "manage.py"),
+                        "bench_asgi",
+                        "--worker",
+                        mode,
+                        "--concurrency",
+                        str(concurrency),
+                        "--rounds",
+                        str(options["rounds"]),
+                    ]
+                    output = subprocess.run(command, env=env, stdout=subprocess.PIPE, text=True, check=True).stdout
+                    self.report(mode, concurrency, json.loads(output))
+
+    def report(self, mode, concurrency, result):
+        latencies = sorted(result["latencies"])
+        p50 = statistics.median(latencies) * 1000
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+        per_connection = result["rss_growth"] / concurrency / 1024
+        self.stdout.write(
+            f"{mode} x{concurrency:<4}: {len(latencies) / result['elapsed']:7,.0f} req/s  p50 {p50:7.2f} ms  "
+            f"p99 {p99:7.2f} ms  {result['threads']:3} threads  {per_connection:8,.1f} KiB RSS per connection"
+        )
+
+    def run_worker(self, mode, concurrency, rounds):
+        item_id = get_menu_snapshot().available[0].id
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            # One unmeasured round so imports, templates and caches are warm.
+            _run_sync_connection(item_id, 1)
+            rss_before = _peak_rss()
+            started = time.perf_counter()
+            if mode == "wsgi":
+                with ThreadPoolExecutor(concurrency) as executor:
+                    results = list(executor.map(_run_sync_connection, [item_id] * concurrency, [rounds] * concurrency))
+                    threads = threading.active_count()
+                latencies = [latency for result in results for latency in result]
+            else:
+                latencies = asyncio.run(_run_async(item_id, concurrency, rounds))
+                threads = threading.active_count()
+            elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            json.dumps(
+                {
+                    "latencies": latencies,
+                    "elapsed": elapsed,
+                    "threads": threads,
+                    "rss_growth": max(_peak_rss() - rss_before, 0),
+                }
+            )
+        )
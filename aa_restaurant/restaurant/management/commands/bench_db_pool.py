@@ -0,0 +1,112 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.urls import reverse
+
+from restaurant.management.commands.bench_funnel import CSRF_FIELD, HttpDriver, _serve_wsgi
+from restaurant.menu_snapshot import get_menu_snapshot
+
+
+MODES = {"pooled": "1", "unpooled": "0"}
+ENDPOINTS = ("menu", "cart_add", "cart", "checkout")
+
+CHECKOUT_FORM = {
+    "name": "Load Test",
+    "email": "loadtest@example.com",
+    "phone": "0000000000",
+    "address": "Load Test",
+    "paymentMethod": "COD",
+}
+
+
+def _run_customer(base_url, item_id, rounds):
+    # Over HTTP, like bench_funnel's wsgi driver: the test client disconnects
+    # close_old_connections, so connections would never be closed or pooled.
+    driver = HttpDriver(base_url)
+    timings = {endpoint: [] for endpoint in ENDPOINTS}
+
+    def step(endpoint, method, path, data=None, expect=(200,), as_json=False):
+        status, _location, content, _queries, elapsed = driver.request(method, path, data, as_json)
+        if status not in expect:
+            raise CommandError(f"{endpoint} returned {status}")
+        timings[endpoint].append(elapsed)
+
+    for _ in range(rounds):
+        step("menu", "get", reverse("restaurant:menu"))
+        step("cart_add", "post", reverse("restaurant:cart_increase"), {"item_id": item_id}, as_json=True)
+        step("cart", "get", reverse("restaurant:cart"))
+        content = driver.request("get", reverse("restaurant:checkout"))[2]
+        token = CSRF_FIELD.search(content.decode())
+        form = {**CHECKOUT_FORM, "csrfmiddlewaretoken": token.group(1) if token else ""}
+        step("checkout", "post", reverse("restaurant:checkout"), form, expect=(302,))
+    return timings
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test menu, cart and checkout with and without MySQL connection pooling. "
+        "Checkouts create real orders, so point it at a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=8, help="Simulated customers (threads).")
+        parser.add_argument("--rounds", type=int, default=25, help="Menu -> cart -> checkout rounds per customer.")
+        parser.add_argument("--modes", nargs="+", choices=sorted(MODES), default=list(MODES))
+        parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if not get_menu_snapshot().available:
+            raise CommandError("No available menu items; run `manage.py warm_menu` first.")
+
+        if options["worker"]:
+            return self.run_worker(options["concurrency"], options["rounds"])
+
+        if settings.DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3":
+            self.stderr.write("Pooling only applies to MySQL (USE_SQLITE=0); both modes will use SQLite.")
+
+        for mode in options["modes"]:
+            env = dict(os.environ, MYSQL_POOL=MODES[mode])
+            command = [
+                sys.executable,
+                str(settings.BASE_DIR / "manage.py"),
+                "bench_db_pool",
+                "--worker",
+                "--concurrency",
+                str(options["concurrency"]),
+                "--rounds",
+                str(options["rounds"]),
+            ]
+            output = subprocess.run(command, env=env, stdout=subprocess.PIPE, text=True, check=True).stdout
+            self.report(mode, json.loads(output))
+
+    def report(self, mode, timings):
+        self.stdout.write(f"{mode}:")
+        for endpoint in ENDPOINTS:
+            latencies = sorted(timings[endpoint])
+            p50 = statistics.median(latencies) * 1000
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+            self.stdout.write(f"  {endpoint:>9}: p50 {p50:7.2f} ms  p99 {p99:7.2f} ms  ({len(latencies)} requests)")
+
+    def run_worker(self, concurrency, rounds):
+        item_id = get_menu_snapshot().available[0].id
+        timings = {endpoint: [] for endpoint in ENDPOINTS}
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "127.0.0.1"]):
+            base_url, stop = _serve_wsgi()
+            try:
+                with ThreadPoolExecutor(concurrency) as executor:
+                    for result in executor.map(
+                        _run_customer, [base_url] * concurrency, [item_id] * concurrency, [rounds] * concurrency
+                    ):
+                        for endpoint in ENDPOINTS:
+                            timings[endpoint].extend(result[endpoint])
+            finally:
+                stop()
+        self.stdout.write(json.dumps(timings))
@@ -0,0 +1,415 @@
+import argparse
+import json
+import os
+import re
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from http.cookiejar import CookieJar
+from pathlib import Path
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.db.backends.signals import connection_created
+from django.test import Client, override_settings
+from django.urls import resolve, reverse
+
+from restaurant import views
+from restaurant.menu_snapshot import get_menu_snapshot
+
+
+DRIVERS = ("client", "wsgi", "asgi")
+ENDPOINTS = (
+    "menu",
+    "cart_increase",
+    "cart",
+    "checkout",
+    "checkout_submit",
+    "payment_otp_issue",
+    "payment_otp_verify",
+    "place_order",
+    "order_detail",
+)
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / "benchmarks" / "funnel_baseline.json"
+QUERY_HEADER = "X-Bench-Queries"
+# Latency noise below this is ignored when comparing against a baseline.
+LATENCY_SLACK_MS = 1.0
+
+CHECKOUT_FORM = {
+    "name": "Load Test",
+    "email": "loadtest@example.com",
+    "phone": "0000000000",
+    "address": "Load Test",
+    "paymentMethod": "GPay",
+}
+CSRF_FIELD = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+_query_counter = ContextVar("bench_funnel_queries", default=None)
+
+
+def _count_query(execute, sql, params, many, context):
+    counter = _query_counter.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+def _install_query_counter(sender, connection, **kwargs):
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+def _counting_wsgi(application):
+    def app(environ, start_response):
+        counter = [0]
+        token = _query_counter.set(counter)
+        try:
+
+            def counting_start_response(status, headers, exc_info=None):
+                return start_response(status, [*headers, (QUERY_HEADER, str(counter[0]))], exc_info)
+
+            return application(environ, counting_start_response)
+        finally:
+            _query_counter.reset(token)
+
+    return app
+
+
+def _counting_asgi(application):
+    async def app(scope, receive, send):
+        counter = [0]
+        token = _query_counter.set(counter)
+
+        async def counting_send(message):
+            if message["type"] == "http.response.start":
+                headers = [*message.get("headers", []), (QUERY_HEADER.lower().encode(), str(counter[0]).encode())]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await application(scope, receive, counting_send)
+        finally:
+            _query_counter.reset(token)
+
+    return app
+
+
+class ClientDriver:
+    def __init__(self):
+        self.client = Client()
+
+    def request(self, method, path, data=None, as_json=False):
+        kwargs = {"content_type": "application/json"} if as_json else {}
+        counter = [0]
+        token = _query_counter.set(counter)
+        try:
+            started = time.perf_counter()
+            response = getattr(self.client, method)(path, data or {}, **kwargs)
+            elapsed = time.perf_counter() - started
+        finally:
+            _query_counter.reset(token)
+        return response.status_code, response.get("Location"), response.content, counter[0], elapsed
+
+
+class _NoRedirect(HTTPRedirectHandler):
+    # Each funnel step is timed on its own, so redirects are followed explicitly.
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpDriver:
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()), _NoRedirect)
+
+    def request(self, method, path, data=None, as_json=False):
+        request = Request(self.base_url + path, method=method.upper())
+        if method == "post":
+            if as_json:
+                request.data = json.dumps(data or {}).encode()
+                request.add_header("Content-Type", "application/json")
+            else:
+                request.data = urlencode(data or {}).encode()
+        started = time.perf_counter()
+        try:
+            with self.opener.open(request) as response:
+                status, headers, content = response.status, response.headers, response.read()
+        except HTTPError as error:
+            status, headers, content = error.code, error.headers, error.read()
+        elapsed = time.perf_counter() - started
+        return status, headers.get("Location"), content, int(headers.get(QUERY_HEADER, 0)), elapsed
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve_wsgi():
+    from django.core.wsgi import get_wsgi_application
+
+    server = ThreadedWSGIServer(("127.0.0.1", 0), _QuietRequestHandler)
+    server.set_app(_counting_wsgi(get_wsgi_application()))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def stop():
+        server.shutdown()
+        server.server_close()
+
+    return f"http://127.0.0.1:{server.server_port}", stop
+
+
+def _serve_asgi():
+    try:
+        import uvicorn
+    except ImportError:
+        raise CommandError("The asgi driver needs uvicorn (pip install uvicorn).")
+    # Serve the deployed ASGI application, with the async views it routes to.
+    from aa_restaurant.asgi import application
+
+    if not settings.ASYNC_VIEWS or resolve(reverse("restaurant:menu")).func is not views.amenu:
+        raise CommandError("The asgi driver needs ASYNC_VIEWS=1 so the async views are routed.")
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    config = uvicorn.Config(
+        _counting_asgi(application), host="127.0.0.1", port=port, lifespan="off", log_level="warning"
+    )
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise CommandError("uvicorn failed to start.")
+        time.sleep(0.01)
+
+    def stop():
+        server.should_exit = True
+        thread.join()
+
+    return f"http://127.0.0.1:{port}", stop
+
+
+def _run_funnel(driver, item_id, clicks, record):
+    def step(endpoint, method, path, data=None, expect=(200,), as_json=False):
+        status, location, content, queries, elapsed = driver.request(method, path, data, as_json)
+        if status not in expect:
+            raise CommandError(f"{endpoint} returned {status}")
+        record(endpoint, elapsed, queries)
+        return location, content
+
+    step("menu", "get", reverse("restaurant:menu"))
+    for _ in range(clicks):
+        # Sent as JSON, like the menu page's fetch() calls.
+        step("cart_increase", "post", reverse("restaurant:cart_increase"), {"item_id": item_id}, as_json=True)
+    step("cart", "get", reverse("restaurant:cart"))
+
+    _location, content = step("checkout", "get", reverse("restaurant:checkout"))
+    token = CSRF_FIELD.search(content.decode())
+    csrf = {"csrfmiddlewaretoken": token.group(1) if token else ""}
+    step("checkout_submit", "post", reverse("restaurant:checkout"), {**CHECKOUT_FORM, **csrf}, expect=(302,))
+
+    _location, content = step("payment_otp_issue", "post", reverse("restaurant:payment_otp_issue"), csrf)
+    code = json.loads(content).get("otp")
+    if not code:
+        raise CommandError("payment_otp_issue did not return the OTP; PAYMENT_OTP_DEMO must be on.")
+    _location, content = step("payment_otp_verify", "post", reverse("restaurant:payment_otp_verify"), {"otp": code, **csrf})
+    if not json.loads(content).get("success"):
+        raise CommandError("payment_otp_verify rejected the OTP.")
+
+    location, _content = step("place_order", "get", reverse("restaurant:place_order"), expect=(302,))
+    step("order_detail", "get", location)
+
+
+def _percentile(latencies, fraction):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))]
+
+
+def summarize(result):
+    summary = {"funnels_per_second": round(result["funnels"] / result["elapsed"], 2), "endpoints": {}}
+    for endpoint in ENDPOINTS:
+        latencies = sorted(result["latencies"][endpoint])
+        queries = result["queries"][endpoint]
+        summary["endpoints"][endpoint] = {
+            "requests": len(latencies),
+            # Requests/s one connection sustains on this endpoint (1 / mean latency).
+            "rps": round(len(latencies) / sum(latencies), 1),
+            "p50_ms": round(statistics.median(latencies) * 1000, 2),
+            "p95_ms": round(_percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+            "queries": round(sum(queries) / len(queries), 2),
+        }
+    return summary
+
+
+def compare(summary, baseline, tolerance):
+    regressions = []
+    for endpoint, base in baseline["endpoints"].items():
+        current = summary["endpoints"].get(endpoint)
+        if current is None:
+            continue
+        if current["queries"] > base["queries"] + 0.01:
+            regressions.append(f"{endpoint}: {current['queries']} queries/request (baseline {base['queries']})")
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance) + LATENCY_SLACK_MS:
+            regressions.append(f"{endpoint}: p95 {current['p95_ms']} ms (baseline {base['p95_ms']} ms)")
+        if current["rps"] < base["rps"] / (1 + tolerance):
+            regressions.append(f"{endpoint}: {current['rps']} req/s (baseline {base['rps']} req/s)")
+    return regressions
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the ordering funnel (menu -> cart -> checkout -> OTP -> place order -> order detail) through "
+        "the test client and a real server against a copy of the SQLite database, and compare with a baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--drivers", nargs="+", choices=DRIVERS, default=["client", "wsgi"])
+        parser.add_argument("--concurrency", type=int, default=4, help="Simulated customers (threads).")
+        parser.add_argument("--funnels", type=int, default=25, help="Complete funnels per customer.")
+        parser.add_argument("--clicks", type=int, default=3, help="cart_increase clicks per funnel.")
+        parser.add_argument("--warmup", type=int, default=2, help="Unmeasured funnels run before measuring.")
+        parser.add_argument(
+            "--save-baseline", nargs="?", const=str(DEFAULT_BASELINE), default=None, metavar="PATH",
+            help=f"Write the results as the new baseline (default {DEFAULT_BASELINE.relative_to(settings.BASE_DIR)}).",
+        )
+        parser.add_argument(
+            "--compare", nargs="?", const=str(DEFAULT_BASELINE), default=None, metavar="PATH",
+            help="Fail if queries/request grew or latency/throughput regressed beyond --tolerance.",
+        )
+        parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed latency/throughput regression (0.5 = 50%%).")
+        parser.add_argument("--json", action="store_true", help="Print the summary as JSON.")
+        parser.add_argument("--worker", choices=DRIVERS, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options["worker"]:
+            return self.run_worker(options["worker"], options)
+
+        if settings.DATABASES["default"]["ENGINE"] != "django.db.backends.sqlite3":
+            raise CommandError("bench_funnel needs USE_SQLITE=1.")
+        if not get_menu_snapshot().available:
+            raise CommandError("No available menu items; run `manage.py warm_menu` first.")
+
+        baseline = None
+        if options["compare"]:
+            try:
+                baseline = json.loads(Path(options["compare"]).read_text())
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Cannot read baseline {options['compare']}: {exc}")
+
+        source = str(settings.DATABASES["default"]["NAME"])
+        results = {}
+        with tempfile.TemporaryDirectory() as directory:
+            for driver in options["drivers"]:
+                # Every driver starts from an identical copy; the funnel creates real orders.
+                path = os.path.join(directory, f"{driver}.sqlite3")
+                with sqlite3.connect(source) as src, sqlite3.connect(path) as dst:
+                    src.backup(dst)
+                results[driver] = summarize(self.run_driver(driver, path, options))
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            for driver, summary in results.items():
+                self.report(driver, summary)
+
+        if options["save_baseline"]:
+            target = Path(options["save_baseline"])
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+            self.stdout.write(f"Baseline written to {target}")
+
+        if baseline is not None:
+            regressions = []
+            for driver, summary in results.items():
+                if driver in baseline:
+                    regressions.extend(f"{driver} {line}" for line in compare(summary, baseline[driver], options["tolerance"]))
+            if regressions:
+                raise CommandError("Funnel regressed against the baseline:\n  " + "\n  ".join(regressions))
+            self.stdout.write(f"No regressions against {options['compare']}.")
+
+    def run_driver(self, driver, path, options):
+        # The menu does not change during a run. A long version check interval keeps
+        # the periodic version re-reads (one per worker every few seconds) out of the
+        # per-request query counts, which would otherwise depend on how long the run took.
+        env = dict(
+            os.environ,
+            SQLITE_PATH=path,
+            PAYMENT_OTP_DEMO="1",
+            MENU_WARMUP_ON_MIGRATE="0",
+            MENU_VERSION_CHECK_INTERVAL="3600",
+            # Settings load before the worker starts, so the views are chosen here.
+            ASYNC_VIEWS="1" if driver == "asgi" else "0",
+        )
+        command = [sys.executable, str(settings.BASE_DIR / "manage.py"), "bench_funnel", "--worker", driver]
+        for option in ("concurrency", "funnels", "clicks", "warmup"):
+            command += [f"--{option}", str(options[option])]
+        process = subprocess.run(command, env=env, stdout=subprocess.PIPE, text=True)
+        if process.returncode:
+            raise CommandError(f"The {driver} worker failed (exit status {process.returncode}).")
+        return json.loads(process.stdout)
+
+    def report(self, driver, summary):
+        self.stdout.write(f"{driver}: {summary['funnels_per_second']:,.1f} funnels/s")
+        for endpoint, stats in summary["endpoints"].items():
+            self.stdout.write(
+                f"  {endpoint:>18}: {stats['rps']:7,.1f} req/s  p50 {stats['p50_ms']:7.2f} ms  "
+                f"p95 {stats['p95_ms']:7.2f} ms  p99 {stats['p99_ms']:7.2f} ms  {stats['queries']:5.2f} queries"
+            )
+
+    def run_worker(self, driver, options):
+        connection_created.connect(_install_query_counter)
+        item_id = get_menu_snapshot().available[0].id
+        latencies = {endpoint: [] for endpoint in ENDPOINTS}
+        queries = {endpoint: [] for endpoint in ENDPOINTS}
+        lock = threading.Lock()
+
+        def record(endpoint, elapsed, count):
+            with lock:
+                latencies[endpoint].append(elapsed)
+                queries[endpoint].append(count)
+
+        def customer(make_driver):
+            client = make_driver()
+            for _ in range(options["warmup"]):
+                _run_funnel(client, item_id, options["clicks"], lambda *args: None)
+            started = time.perf_counter()
+            for _ in range(options["funnels"]):
+                _run_funnel(client, item_id, options["clicks"], record)
+            return started, time.perf_counter()
+
+        stop = None
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver", "127.0.0.1"]):
+            if driver == "client":
+                make_driver = ClientDriver
+            else:
+                base_url, stop = _serve_wsgi() if driver == "wsgi" else _serve_asgi()
+
+                def make_driver():
+                    return HttpDriver(base_url)
+
+            try:
+                with ThreadPoolExecutor(options["concurrency"]) as executor:
+                    windows = list(executor.map(customer, [make_driver] * options["concurrency"]))
+            finally:
+                if stop is not None:
+                    stop()
+
+        # Throughput over the measured window only, not warm-up or server start.
+        elapsed = max(end for _start, end in windows) - min(start for start, _end in windows)
+        funnels = options["concurrency"] * options["funnels"]
+        self.stdout.write(json.dumps({"elapsed": elapsed, "funnels": funnels, "latencies": latencies, "queries": queries}))
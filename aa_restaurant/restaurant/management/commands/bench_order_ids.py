@@ -0,0 +1,44 @@
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from restaurant.order_ids import get_order_id_generator
+
+
+def _generate(count):
+    generator = get_order_id_generator()
+    return [generator() for _ in range(count)]
+
+
+class Command(BaseCommand):
+    help = "Generate order ids in parallel processes and fail if any two collide."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=8)
+        parser.add_argument("--per-process", type=int, default=250000)
+
+    def handle(self, *args, **options):
+        processes = options["processes"]
+        per_process = options["per_process"]
+
+        # Generate one id first so forked workers inherit an already-used generator.
+        get_order_id_generator()()
+
+        started = time.perf_counter()
+        seen = set()
+        total = 0
+        with multiprocessing.Pool(processes) as pool:
+            for ids in pool.imap_unordered(_generate, [per_process] * processes):
+                seen.update(ids)
+                total += len(ids)
+        elapsed = time.perf_counter() - started
+
+        collisions = total - len(seen)
+        self.stdout.write(
+            f"{total} ids from {processes} processes in {elapsed:.2f}s "
+            f"({total / elapsed:,.0f} ids/s), {collisions} collisions"
+        )
+        if collisions:
+            raise CommandError(f"{collisions} duplicate order ids generated.")
+        self.stdout.write(self.style.SUCCESS("No collisions."))
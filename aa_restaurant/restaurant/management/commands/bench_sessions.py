@@ -0,0 +1,54 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from restaurant.menu_snapshot import get_menu_snapshot
+
+
+class Command(BaseCommand):
+    help = "Measure cart-click throughput for each session tier."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clicks", type=int, default=500)
+        parser.add_argument(
+            "--tiers",
+            nargs="+",
+            choices=sorted(settings.SESSION_ENGINES),
+            default=list(settings.SESSION_ENGINES),
+        )
+
+    def handle(self, *args, **options):
+        snapshot = get_menu_snapshot()
+        if not snapshot.available:
+            raise CommandError("No available menu items; run `manage.py warm_menu` first.")
+        item_id = snapshot.available[0].id
+        url = reverse("restaurant:cart_increase")
+        clicks = options["clicks"]
+
+        for tier in options["tiers"]:
+            with override_settings(
+                SESSION_ENGINE=settings.SESSION_ENGINES[tier],
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+            ):
+                client = Client()
+                # The first click creates the session; only steady-state clicks are timed.
+                client.post(url, {"item_id": item_id})
+
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    for _ in range(clicks):
+                        client.post(url, {"item_id": item_id})
+                    elapsed = time.perf_counter() - started
+
+                client.logout()
+
+            self.stdout.write(
+                f"{tier:>15}: {clicks / elapsed:8,.0f} clicks/s "
+                f"{elapsed * 1000 / clicks:6.2f} ms/click "
+                f"{len(queries) / clicks:5.2f} queries/click"
+            )
@@ -0,0 +1,119 @@
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections
+
+from restaurant.menu_snapshot import get_menu_snapshot
+from restaurant.models import Order
+
+
+PROFILES = ("default", "tuned")
+
+
+def _checkout(records):
+    Order.objects.create_with_items(
+        [
+            {
+                "menu_item_id": record.id,
+                "name": record.name,
+                "category": record.category,
+                "price": record.price,
+                "quantity": 1,
+            }
+            for record in records
+        ],
+        customer_name="Bench",
+        customer_email="bench@example.com",
+        customer_phone="0000000000",
+        address="Bench",
+    )
+    # The order list a customer lands on afterwards.
+    list(Order.objects.order_by("-created_at")[:10])
+
+
+class Command(BaseCommand):
+    help = "Compare checkout throughput of the default and tuned SQLite profiles under concurrent workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--orders", type=int, default=200, help="Checkouts per worker.")
+        parser.add_argument("--profiles", nargs="+", choices=PROFILES, default=list(PROFILES))
+        parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options["worker"]:
+            return self.run_worker(options["orders"])
+
+        if settings.DATABASES["default"]["ENGINE"] != "django.db.backends.sqlite3":
+            raise CommandError("bench_sqlite needs USE_SQLITE=1.")
+        if not get_menu_snapshot().available:
+            raise CommandError("No available menu items; run `manage.py warm_menu` first.")
+
+        source = str(settings.DATABASES["default"]["NAME"])
+        with tempfile.TemporaryDirectory() as directory:
+            for profile in options["profiles"]:
+                # Every profile starts from an identical copy of the current database.
+                path = os.path.join(directory, f"{profile}.sqlite3")
+                with sqlite3.connect(source) as src, sqlite3.connect(path) as dst:
+                    src.backup(dst)
+                self.report(profile, self.run_profile(profile, path, options["workers"], options["orders"]))
+
+    def run_profile(self, profile, path, workers, orders):
+        env = dict(os.environ, SQLITE_PATH=path, SQLITE_PROFILE=profile, MENU_WARMUP_ON_MIGRATE="0")
+        command = [sys.executable, str(settings.BASE_DIR / "manage.py"), "bench_sqlite", "--worker", "--orders", str(orders)]
+
+        processes = [subprocess.Popen(command, env=env, stdout=subprocess.PIPE, text=True) for _ in range(workers)]
+        results = [json.loads(process.communicate()[0]) for process in processes]
+
+        # Throughput over the window in which workers were actually checking out,
+        # so interpreter start-up is not counted.
+        elapsed = max(result["finished"] for result in results) - min(result["started"] for result in results)
+        latencies = sorted(latency for result in results for latency in result["latencies"])
+        return {
+            "elapsed": elapsed,
+            "ok": len(latencies),
+            "locked": sum(result["locked"] for result in results),
+            "latencies": latencies,
+        }
+
+    def report(self, profile, result):
+        latencies = result["latencies"]
+        if latencies:
+            p50 = statistics.median(latencies) * 1000
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+        else:
+            p50 = p99 = 0.0
+        self.stdout.write(
+            f"{profile:>8}: {result['ok'] / result['elapsed']:7,.0f} checkouts/s "
+            f"p50 {p50:6.2f} ms  p99 {p99:7.2f} ms  {result['locked']} 'database is locked' errors"
+        )
+
+    def run_worker(self, orders):
+        records = get_menu_snapshot().available[:3]
+        latencies = []
+        locked = 0
+        started_at = time.time()
+        for _ in range(orders):
+            # Mirror the request cycle: Django calls this on request start and finish.
+            close_old_connections()
+            started = time.perf_counter()
+            try:
+                _checkout(records)
+            except OperationalError:
+                locked += 1
+            else:
+                latencies.append(time.perf_counter() - started)
+        finished_at = time.time()
+        close_old_connections()
+        self.stdout.write(
+            json.dumps({"latencies": latencies, "locked": locked, "started": started_at, "finished": finished_at})
+        )
@@ -0,0 +1,89 @@
+import re
+import tempfile
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.contrib.staticfiles.handlers import StaticFilesHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from restaurant.static_handler import StaticFilesWSGI
+
+
+BUILD_STORAGES = {
+    **settings.STORAGES,
+    "staticfiles": {"BACKEND": "restaurant.storage.CompressedManifestStaticFilesStorage"},
+}
+PLAIN_STORAGES = {
+    **settings.STORAGES,
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+ACCEPT_ENCODING = "gzip, deflate, br"
+
+
+def _fetch(handler, url, extra=None):
+    environ = {"PATH_INFO": url, "REQUEST_METHOD": "GET", "HTTP_ACCEPT_ENCODING": ACCEPT_ENCODING, **(extra or {})}
+    setup_testing_defaults(environ)
+    captured = {}
+
+    def start_response(status, headers, exc_info=None):
+        captured["status"] = int(status.split()[0])
+        captured["headers"] = {key.lower(): value for key, value in headers}
+
+    body = b"".join(handler(environ, start_response))
+    return captured["status"], captured["headers"], len(body)
+
+
+def _is_fresh(headers):
+    cache_control = headers.get("cache-control", "")
+    return "immutable" in cache_control or re.search(r"max-age=[1-9]", cache_control) is not None
+
+
+class Command(BaseCommand):
+    help = "Compare static bytes and requests per page view with and without the static build mode."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default=None, help="Page to measure (defaults to the menu page).")
+
+    def handle(self, *args, **options):
+        url = options["url"] or reverse("restaurant:menu")
+        with tempfile.TemporaryDirectory() as static_root:
+            with override_settings(STATIC_ROOT=static_root, STORAGES=BUILD_STORAGES):
+                call_command("collectstatic", interactive=False, verbosity=0)
+
+            with override_settings(STORAGES=PLAIN_STORAGES):
+                self.measure("plain", url, StaticFilesHandler(WSGIHandler()))
+            with override_settings(STATIC_ROOT=static_root, STORAGES=BUILD_STORAGES):
+                self.measure("build", url, StaticFilesWSGI(WSGIHandler(), root=static_root))
+
+    def measure(self, mode, url, handler):
+        # Hashed URLs are only emitted with DEBUG off, as in production.
+        with override_settings(DEBUG=False, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            html = Client().get(url).content.decode()
+            assets = sorted(set(re.findall(r'(?:href|src)="(%s[^"]+)"' % re.escape(settings.STATIC_URL), html)))
+
+            first_bytes = 0
+            repeat_requests = 0
+            repeat_bytes = 0
+            for asset in assets:
+                status, headers, size = _fetch(handler, asset)
+                first_bytes += size
+                if _is_fresh(headers):
+                    continue
+                # Without a freshness lifetime the browser revalidates on every view.
+                validators = {}
+                if "etag" in headers:
+                    validators["HTTP_IF_NONE_MATCH"] = headers["etag"]
+                if "last-modified" in headers:
+                    validators["HTTP_IF_MODIFIED_SINCE"] = headers["last-modified"]
+                _status, _headers, size = _fetch(handler, asset, validators)
+                repeat_requests += 1
+                repeat_bytes += size
+
+        self.stdout.write(
+            f"{mode:>5}: {len(assets)} static asset(s); first view {first_bytes:,} bytes in {len(assets)} request(s), "
+            f"repeat view {repeat_bytes:,} bytes in {repeat_requests} request(s)"
+        )
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from restaurant.menu_version import bump_menu_version
+from restaurant.models import MenuItem
+from restaurant.thumbnails import refresh_image_variants
+
+
+class Command(BaseCommand):
+    help = "Generate resized WebP/JPEG variants for menu item images."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+        parser.add_argument("--force", action="store_true", help="Regenerate variants that are already current.")
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        items = MenuItem.objects.using(using).only("id", "image", "image_variants")
+        changed = [item for item in items if refresh_image_variants(item, force=options["force"])]
+        if changed:
+            MenuItem.objects.using(using).bulk_update(changed, ["image_variants"])
+            bump_menu_version()
+        self.stdout.write(self.style.SUCCESS(f"Updated image variants for {len(changed)} menu item(s)."))
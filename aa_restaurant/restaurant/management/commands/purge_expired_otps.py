@@ -0,0 +1,51 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+
+from restaurant.models import Order, PaymentOTP
+
+
+class Command(BaseCommand):
+    help = "Delete expired, unverified payment OTPs in small chunks and fail their unpaid orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument("--grace-minutes", type=int, default=0, help="Keep OTPs this long after they expire.")
+        parser.add_argument("--sleep", type=float, default=0.0, help="Seconds to pause between chunks.")
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        chunk_size = max(1, options["chunk_size"])
+        cutoff = timezone.now() - timedelta(minutes=options["grace_minutes"])
+
+        deleted = 0
+        failed = 0
+        while True:
+            # Walk the expires_at index one short transaction at a time so the
+            # sweep never holds a long write lock on the OTP table. Verified OTPs
+            # stay: place_order still needs them after they expire.
+            rows = list(
+                PaymentOTP.objects.using(using)
+                .filter(expires_at__lt=cutoff, is_verified=False)
+                .order_by("expires_at")
+                .values_list("pk", "order_id")[:chunk_size]
+            )
+            if not rows:
+                break
+
+            with transaction.atomic(using=using):
+                failed += (
+                    Order.objects.using(using)
+                    .filter(pk__in=[order_pk for _pk, order_pk in rows], status=Order.STATUS_AWAITING_PAYMENT)
+                    .update(status=Order.STATUS_PAYMENT_FAILED)
+                )
+                deleted += PaymentOTP.objects.using(using).filter(pk__in=[pk for pk, _order_pk in rows]).delete()[0]
+
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired OTP(s), marked {failed} order(s) as payment failed."))
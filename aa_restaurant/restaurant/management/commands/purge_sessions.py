@@ -0,0 +1,52 @@
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+
+DB_SESSION_ENGINES = (
+    "django.contrib.sessions.backends.db",
+    "django.contrib.sessions.backends.cached_db",
+)
+
+
+class Command(BaseCommand):
+    help = "Delete expired rows from django_session in small chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--sleep", type=float, default=0.0, help="Seconds to pause between chunks.")
+
+    def handle(self, *args, **options):
+        if settings.SESSION_ENGINE not in DB_SESSION_ENGINES:
+            # Cache and cookie sessions expire on their own; let the engine do
+            # whatever cleanup it supports.
+            import_module(settings.SESSION_ENGINE).SessionStore.clear_expired()
+            self.stdout.write(f"{settings.SESSION_ENGINE} does not store sessions in the database; nothing to purge.")
+            return
+
+        using = options["database"]
+        chunk_size = max(1, options["chunk_size"])
+        now = timezone.now()
+
+        # expire_date is indexed; each chunk is its own short DELETE so live
+        # requests can keep writing sessions while the purge runs.
+        deleted = 0
+        while True:
+            keys = list(
+                Session.objects.using(using)
+                .filter(expire_date__lt=now)
+                .values_list("session_key", flat=True)[:chunk_size]
+            )
+            if not keys:
+                break
+            deleted += Session.objects.using(using).filter(session_key__in=keys).delete()[0]
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired session(s)."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from restaurant.catalog import warm_menu
+
+
+class Command(BaseCommand):
+    help = "Seed the sample menu (when empty) and link local images to menu items."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+        parser.add_argument("--skip-seed", action="store_true", help="Only reconcile menu item images.")
+
+    def handle(self, *args, **options):
+        seeded, images = warm_menu(using=options["database"], seed=not options["skip_seed"])
+        self.stdout.write(self.style.SUCCESS(f"Seeded {seeded} menu item(s), linked {images} image(s)."))
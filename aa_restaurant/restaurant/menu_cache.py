@@ -0,0 +1,69 @@
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from .menu_snapshot import aget_menu_snapshot, get_menu_snapshot
+from .menu_version import aget_menu_version, get_menu_version
+
+
+MENU_FRAGMENT_KEY = "restaurant:menu:fragment:{version}"
+# The counters live in the default cache. With LocMemCache that is per process,
+# so /menu/cache-stats/ reports only the worker that answers it.
+MENU_CACHE_HITS_KEY = "restaurant:menu:hits"
+MENU_CACHE_MISSES_KEY = "restaurant:menu:misses"
+
+MENU_FRAGMENT_TEMPLATE = "restaurant/partials/menu_items.html"
+MENU_FRAGMENT_TIMEOUT = 60 * 60 * 24
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+async def _acount(key):
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        if not await cache.aadd(key, 1, None):
+            await cache.aincr(key)
+
+
+def get_menu_fragment():
+    version = get_menu_version()
+    key = MENU_FRAGMENT_KEY.format(version=version)
+    html = cache.get(key)
+    if html is not None:
+        _count(MENU_CACHE_HITS_KEY)
+        return html
+
+    _count(MENU_CACHE_MISSES_KEY)
+    html = render_to_string(MENU_FRAGMENT_TEMPLATE, {"items": get_menu_snapshot(version).available})
+    cache.set(key, html, MENU_FRAGMENT_TIMEOUT)
+    return html
+
+
+async def aget_menu_fragment():
+    version = await aget_menu_version()
+    key = MENU_FRAGMENT_KEY.format(version=version)
+    html = await cache.aget(key)
+    if html is not None:
+        await _acount(MENU_CACHE_HITS_KEY)
+        return html
+
+    await _acount(MENU_CACHE_MISSES_KEY)
+    snapshot = await aget_menu_snapshot(version)
+    html = render_to_string(MENU_FRAGMENT_TEMPLATE, {"items": snapshot.available})
+    await cache.aset(key, html, MENU_FRAGMENT_TIMEOUT)
+    return html
+
+
+def menu_cache_stats():
+    values = cache.get_many([MENU_CACHE_HITS_KEY, MENU_CACHE_MISSES_KEY])
+    return {
+        "version": get_menu_version(),
+        "hits": values.get(MENU_CACHE_HITS_KEY, 0),
+        "misses": values.get(MENU_CACHE_MISSES_KEY, 0),
+    }
@@ -0,0 +1,105 @@
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+from django.db import DEFAULT_DB_ALIAS
+
+from .menu_version import aget_menu_version, get_menu_version
+from .models import MenuItem
+
+
+MenuRecord = namedtuple(
+    "MenuRecord",
+    [
+        "id",
+        "name",
+        "category",
+        "price",
+        "description",
+        "rating",
+        "is_popular",
+        "image_url",
+        "image_variants",
+        "is_available",
+    ],
+)
+
+
+class MenuSnapshot:
+    __slots__ = ("version", "items", "available")
+
+    def __init__(self, version, records):
+        self.version = version
+        self.items = MappingProxyType({record.id: record for record in records})
+        self.available = tuple(record for record in records if record.is_available)
+
+    def get(self, item_id):
+        return self.items.get(item_id)
+
+    def get_available(self, item_id):
+        record = self.items.get(item_id)
+        if record is None or not record.is_available:
+            return None
+        return record
+
+
+_snapshot = None
+_load_lock = threading.Lock()
+
+
+def _record_for(item):
+    return MenuRecord(
+        id=item.id,
+        name=item.name,
+        category=item.category,
+        price=item.price,
+        description=item.description,
+        rating=item.rating,
+        is_popular=item.is_popular,
+        image_url=item.image.url if item.image else (item.image_url or ""),
+        image_variants=MappingProxyType(item.image_variants if item.image else {}),
+        is_available=item.is_available,
+    )
+
+
+def load_menu_snapshot(version):
+    # Always from the primary: a lagging replica would be cached under the new version.
+    items = MenuItem.objects.using(DEFAULT_DB_ALIAS).order_by("category", "name")
+    return MenuSnapshot(version, [_record_for(item) for item in items])
+
+
+async def aload_menu_snapshot(version):
+    items = MenuItem.objects.using(DEFAULT_DB_ALIAS).order_by("category", "name")
+    return MenuSnapshot(version, [_record_for(item) async for item in items])
+
+
+def get_menu_snapshot(version=None):
+    # Callers that already read the version this request pass it in, so the
+    # version is not checked twice.
+    global _snapshot
+    if version is None:
+        version = get_menu_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    with _load_lock:
+        snapshot = _snapshot
+        if snapshot is None or snapshot.version != version:
+            snapshot = load_menu_snapshot(version)
+            _snapshot = snapshot
+    return snapshot
+
+
+async def aget_menu_snapshot(version=None):
+    global _snapshot
+    if version is None:
+        version = await aget_menu_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    # No lock: concurrent coroutines may each load the same version, which is
+    # harmless, and a threading lock would block the event loop.
+    snapshot = await aload_menu_snapshot(version)
+    _snapshot = snapshot
+    return snapshot
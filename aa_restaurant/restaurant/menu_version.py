@@ -0,0 +1,94 @@
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+MENU_VERSION_KEY = "restaurant:menu:version"
+
+# Last version seen by this process, as (version, monotonic time read).
+_last_seen = None
+
+
+def _new_version():
+    return uuid.uuid4().hex[:12]
+
+
+def _store():
+    return getattr(settings, "MENU_VERSION_STORE", "db")
+
+
+def _read_version():
+    if _store() == "db":
+        from .models import MenuVersion
+
+        version = MenuVersion.objects.filter(pk=MenuVersion.SINGLETON_ID).values_list("version", flat=True).first()
+        if version is None:
+            MenuVersion.objects.get_or_create(pk=MenuVersion.SINGLETON_ID, defaults={"version": _new_version()})
+            version = MenuVersion.objects.values_list("version", flat=True).get(pk=MenuVersion.SINGLETON_ID)
+        return version
+
+    version = cache.get(MENU_VERSION_KEY)
+    if version is None:
+        cache.add(MENU_VERSION_KEY, _new_version(), None)
+        version = cache.get(MENU_VERSION_KEY)
+    return version
+
+
+async def _aread_version():
+    if _store() == "db":
+        from .models import MenuVersion
+
+        version = await MenuVersion.objects.filter(pk=MenuVersion.SINGLETON_ID).values_list("version", flat=True).afirst()
+        if version is None:
+            await MenuVersion.objects.aget_or_create(pk=MenuVersion.SINGLETON_ID, defaults={"version": _new_version()})
+            version = await MenuVersion.objects.values_list("version", flat=True).aget(pk=MenuVersion.SINGLETON_ID)
+        return version
+
+    version = await cache.aget(MENU_VERSION_KEY)
+    if version is None:
+        await cache.aadd(MENU_VERSION_KEY, _new_version(), None)
+        version = await cache.aget(MENU_VERSION_KEY)
+    return version
+
+
+def _recently_seen(now):
+    interval = getattr(settings, "MENU_VERSION_CHECK_INTERVAL", 0)
+    seen = _last_seen
+    if seen is not None and interval and now - seen[1] < interval:
+        return seen[0]
+    return None
+
+
+def get_menu_version():
+    global _last_seen
+    now = time.monotonic()
+    version = _recently_seen(now)
+    if version is None:
+        version = _read_version()
+        _last_seen = (version, now)
+    return version
+
+
+async def aget_menu_version():
+    global _last_seen
+    now = time.monotonic()
+    version = _recently_seen(now)
+    if version is None:
+        version = await _aread_version()
+        _last_seen = (version, now)
+    return version
+
+
+def bump_menu_version():
+    global _last_seen
+    version = _new_version()
+    if _store() == "db":
+        from .models import MenuVersion
+
+        MenuVersion.objects.update_or_create(pk=MenuVersion.SINGLETON_ID, defaults={"version": version})
+    else:
+        cache.set(MENU_VERSION_KEY, version, None)
+    _last_seen = (version, time.monotonic())
+    return version
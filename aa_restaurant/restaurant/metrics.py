@@ -0,0 +1,287 @@
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+UNMATCHED_VIEW = "unmatched"
+
+_current = ContextVar("request_metrics", default=None)
+_active_stats = ContextVar("active_query_stats", default=())
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def add(self, key, duration):
+        self.duration += duration
+        self.count += 1
+        self.statements[key] += 1
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.statements.values() if count > 1)
+
+    def most_repeated(self):
+        (_alias, sql, _params), count = self.statements.most_common(1)[0]
+        return sql, count
+
+
+def record_query(execute, sql, params, many, context):
+    # Installed on every connection (restaurant.signals). The stats travel in a
+    # context variable, so queries run by the async ORM's worker threads are
+    # counted for the request that awaited them.
+    active = _active_stats.get()
+    if not active:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        key = (context["connection"].alias, sql, repr(params))
+        for stats in active:
+            stats.add(key, duration)
+
+
+def install_query_recorder(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def track_queries(stats=None):
+    stats = stats if stats is not None else QueryStats()
+    token = _active_stats.set((*_active_stats.get(), stats))
+    try:
+        yield stats
+    finally:
+        _active_stats.reset(token)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = QueryStats()
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.session_read = 0
+        self.session_written = 0
+        self.wall_time = 0.0
+
+    def server_timing(self):
+        queries = f"{self.queries.count} queries"
+        if self.queries.duplicates:
+            queries += f", {self.queries.duplicates} duplicate"
+        return ", ".join(
+            [
+                f"app;dur={self.wall_time * 1000:.2f}",
+                f'db;dur={self.queries.duration * 1000:.2f};desc="{queries}"',
+                f"tpl;dur={self.template_time * 1000:.2f}",
+                f'session;desc="read {self.session_read} B, wrote {self.session_written} B"',
+            ]
+        )
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        # Fragments rendered from inside another template are already counted.
+        metrics.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_depth -= 1
+            if not metrics.template_depth:
+                metrics.template_time += time.perf_counter() - started
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def _escape_label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    # Totals for this process only; scrape each worker separately.
+
+    COUNTERS = (
+        ("db_seconds", "restaurant_request_db_seconds_total", "Time spent in SQL queries."),
+        ("queries", "restaurant_request_queries_total", "SQL queries executed."),
+        ("duplicates", "restaurant_request_duplicate_queries_total", "Queries repeated with identical SQL and parameters."),
+        ("template_seconds", "restaurant_request_template_seconds_total", "Time spent rendering templates."),
+        ("session_read", "restaurant_session_read_bytes_total", "Serialized session bytes loaded."),
+        ("session_written", "restaurant_session_written_bytes_total", "Serialized session bytes saved."),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, view, metrics):
+        with self._lock:
+            totals = self._views.get(view)
+            if totals is None:
+                totals = self._views[view] = {
+                    "buckets": [0] * len(DURATION_BUCKETS),
+                    "count": 0,
+                    "wall_seconds": 0.0,
+                    **{key: 0 for key, _name, _help in self.COUNTERS},
+                }
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if metrics.wall_time <= bound:
+                    totals["buckets"][index] += 1
+            totals["count"] += 1
+            totals["wall_seconds"] += metrics.wall_time
+            totals["db_seconds"] += metrics.queries.duration
+            totals["queries"] += metrics.queries.count
+            totals["duplicates"] += metrics.queries.duplicates
+            totals["template_seconds"] += metrics.template_time
+            totals["session_read"] += metrics.session_read
+            totals["session_written"] += metrics.session_written
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    def render(self):
+        with self._lock:
+            views = {view: {**totals, "buckets": list(totals["buckets"])} for view, totals in sorted(self._views.items())}
+
+        lines = [
+            "# HELP restaurant_request_duration_seconds Wall time per request, by view.",
+            "# TYPE restaurant_request_duration_seconds histogram",
+        ]
+        for view, totals in views.items():
+            label = f'view="{_escape_label(view)}"'
+            for bound, count in zip(DURATION_BUCKETS, totals["buckets"]):
+                lines.append(f'restaurant_request_duration_seconds_bucket{{{label},le="{bound}"}} {count}')
+            lines.append(f'restaurant_request_duration_seconds_bucket{{{label},le="+Inf"}} {totals["count"]}')
+            lines.append(f"restaurant_request_duration_seconds_sum{{{label}}} {totals['wall_seconds']:.6f}")
+            lines.append(f"restaurant_request_duration_seconds_count{{{label}}} {totals['count']}")
+
+        for key, name, help_text in self.COUNTERS:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for view, totals in views.items():
+                value = totals[key]
+                value = f"{value:.6f}" if isinstance(value, float) else str(value)
+                lines.append(f'{name}{{view="{_escape_label(view)}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def _session_size(session, data):
+    return len(session.serializer().dumps(data)) if data else 0
+
+
+class RequestMetricsMiddleware:
+    # Goes first in MIDDLEWARE so every other middleware, including the
+    # session save, is inside the measurement.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # Django would otherwise run a sync process_view in a worker thread.
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            with track_queries(metrics.queries):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, started)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            with track_queries(metrics.queries):
+                response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, started)
+
+    def finish(self, request, response, metrics, started):
+        session = getattr(request, "session", None)
+        if session is not None and session.modified and response.status_code != 500:
+            metrics.session_written = _session_size(session, session._session)
+        metrics.wall_time = time.perf_counter() - started
+
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match is not None else UNMATCHED_VIEW
+        if metrics.queries.duplicates:
+            sql, count = metrics.queries.most_repeated()
+            logger.warning(
+                "%s ran %d duplicate queries; most repeated (%dx): %s", view, metrics.queries.duplicates, count, sql[:300]
+            )
+        registry.record(view, metrics)
+        response["Server-Timing"] = metrics.server_timing()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        self.measure_session_reads(request)
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        self.measure_session_reads(request)
+
+    def measure_session_reads(self, request):
+        session = getattr(request, "session", None)
+        if session is None:
+            return
+        metrics = _current.get()
+        if hasattr(session, "_session_cache"):
+            metrics.session_read = _session_size(session, session._session_cache)
+            return
+
+        load = session.load
+        aload = session.aload
+
+        def measured_load():
+            data = load()
+            metrics.session_read = _session_size(session, data)
+            return data
+
+        async def measured_aload():
+            data = await aload()
+            metrics.session_read = _session_size(session, data)
+            return data
+
+        # Sessions load lazily; count the bytes only if this request reads it.
+        session.load = measured_load
+        session.aload = measured_aload
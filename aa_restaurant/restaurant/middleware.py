@@ -0,0 +1,41 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .routers import STICKY_SESSION_KEY, request_routing
+
+
+class ReplicaStickinessMiddleware:
+    # Must come after SessionMiddleware.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not getattr(settings, "DATABASE_REPLICA_ALIAS", None):
+            return self.get_response(request)
+
+        pinned = request.session.get(STICKY_SESSION_KEY, 0) > time.time()
+        with request_routing(pinned=pinned) as state:
+            response = self.get_response(request)
+        if state["wrote"]:
+            request.session[STICKY_SESSION_KEY] = time.time() + settings.REPLICA_STICKY_SECONDS
+        return response
+
+    async def __acall__(self, request):
+        if not getattr(settings, "DATABASE_REPLICA_ALIAS", None):
+            return await self.get_response(request)
+
+        pinned = await request.session.aget(STICKY_SESSION_KEY, 0) > time.time()
+        with request_routing(pinned=pinned) as state:
+            response = await self.get_response(request)
+        if state["wrote"]:
+            await request.session.aset(STICKY_SESSION_KEY, time.time() + settings.REPLICA_STICKY_SECONDS)
+        return response
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:56
+
+import restaurant.order_ids
+from django.db import migrations, models
+
+
+def fill_missing_order_ids(apps, schema_editor):
+    Order = apps.get_model("restaurant", "Order")
+    orders = Order.objects.using(schema_editor.connection.alias)
+    missing = list(orders.filter(models.Q(order_id__isnull=True) | models.Q(order_id="")).only("id"))
+    for order in missing:
+        order.order_id = restaurant.order_ids.new_order_id()
+    orders.bulk_update(missing, ["order_id"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0006_order_dashboard_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_missing_order_ids, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:56
+
+import restaurant.order_ids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0007_fill_missing_order_ids'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='order_id',
+            field=models.CharField(default=restaurant.order_ids.new_order_id, max_length=20, unique=True),
+        ),
+    ]
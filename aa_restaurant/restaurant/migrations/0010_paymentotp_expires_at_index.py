@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0009_menuversion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='paymentotp',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
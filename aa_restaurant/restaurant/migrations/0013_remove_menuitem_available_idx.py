@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:13
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0012_menuitem_image_variants'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='menuitem',
+            name='menuitem_available_idx',
+        ),
+    ]
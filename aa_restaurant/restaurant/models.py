@@ -1,7 +1,34 @@
+import secrets
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
 from decimal import Decimal
 
-from django.db import models
-from django.db.models import Sum
+from django.db import models, transaction
+from django.db.models import Case, F, Sum, Value, When
+from django.utils import timezone
+
+from .order_ids import new_order_id
+
+
+_deferred_order_totals = ContextVar("deferred_order_totals", default=None)
+
+
+@contextmanager
+def defer_order_totals():
+    pending = _deferred_order_totals.get()
+    if pending is not None:
+        yield pending
+        return
+
+    pending = {}
+    token = _deferred_order_totals.set(pending)
+    try:
+        yield pending
+    finally:
+        _deferred_order_totals.reset(token)
+    for order in pending.values():
+        order.update_totals()
 
 
 class Category(models.Model):
@@ -33,13 +60,55 @@ class MenuItem(models.Model):
     is_popular = models.BooleanField(default=False)
     image_url = models.URLField(blank=True, null=True)
     image = models.ImageField(upload_to="menu_items/", blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     is_available = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["category", "name"], name="menuitem_category_name_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
 
+class MenuVersion(models.Model):
+    SINGLETON_ID = 1
+
+    version = models.CharField(max_length=32)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.version
+
+
+def _order_lines(items):
+    lines = []
+    subtotal = Decimal("0.00")
+    for data in items:
+        line = OrderItem(**data)
+        line.line_total = (line.price or Decimal("0.00")) * line.quantity
+        subtotal += line.line_total
+        lines.append(line)
+    return lines, subtotal
+
+
+class OrderManager(models.Manager):
+    def create_with_items(self, items, **fields):
+        lines, subtotal = _order_lines(items)
+
+        if "delivery_fee" not in fields:
+            fields["delivery_fee"] = Decimal("30.00") if subtotal > 0 else Decimal("0.00")
+
+        with transaction.atomic(using=self.db):
+            order = self.create(subtotal=subtotal, **fields)
+            for line in lines:
+                line.order = order
+            OrderItem.objects.using(self.db).bulk_create(lines)
+        return order
+
+
 class Order(models.Model):
     PAYMENT_METHOD_COD = "COD"
     PAYMENT_METHOD_PHONEPE = "PhonePe"
@@ -53,7 +122,11 @@ class Order(models.Model):
         (PAYMENT_METHOD_PAYTM, "Paytm"),
     ]
 
-    order_id = models.CharField(max_length=20, unique=True, blank=True, null=True)
+    STATUS_AWAITING_PAYMENT = "Awaiting Payment"
+    STATUS_PAYMENT_FAILED = "Payment Failed"
+    UNPLACED_STATUSES = [STATUS_AWAITING_PAYMENT, STATUS_PAYMENT_FAILED]
+
+    order_id = models.CharField(max_length=20, unique=True, default=new_order_id)
     customer_name = models.CharField(max_length=200)
     customer_email = models.EmailField()
     customer_phone = models.CharField(max_length=20)
@@ -67,6 +140,16 @@ class Order(models.Model):
     total = models.DecimalField(max_digits=8, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = OrderManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="order_status_created_idx"),
+            models.Index(fields=["created_at"], name="order_created_idx"),
+            models.Index(fields=["payment_status", "created_at"], name="order_pay_status_created_idx"),
+            models.Index(fields=["payment_method", "created_at"], name="order_pay_method_created_idx"),
+        ]
+
     def update_totals(self):
         aggregate = self.items.aggregate(subtotal=Sum("line_total"))
         subtotal = aggregate["subtotal"] or Decimal("0.00")
@@ -74,6 +157,19 @@ class Order(models.Model):
         self.total = subtotal + (self.delivery_fee or Decimal("0.00"))
         super().save(update_fields=["subtotal", "total"])
 
+    def replace_items(self, items):
+        # Re-prices an unpaid order, e.g. from a cart changed after it was created.
+        lines, subtotal = _order_lines(items)
+        for line in lines:
+            line.order = self
+        using = self._state.db
+        with transaction.atomic(using=using):
+            self.items.all().delete()
+            OrderItem.objects.using(using).bulk_create(lines)
+            self.subtotal = subtotal
+            self.total = subtotal + (self.delivery_fee or Decimal("0.00"))
+            super().save(update_fields=["subtotal", "total"])
+
     def save(self, *args, **kwargs):
         if self.subtotal is not None and self.delivery_fee is not None:
             self.total = (self.subtotal or Decimal("0.00")) + (self.delivery_fee or Decimal("0.00"))
@@ -96,13 +192,49 @@ class OrderItem(models.Model):
         if self.price is not None and self.quantity is not None:
             self.line_total = (self.price or Decimal("0.00")) * self.quantity
         super().save(*args, **kwargs)
-        if self.order_id:
+        if not self.order_id:
+            return
+        pending = _deferred_order_totals.get()
+        if pending is None:
             self.order.update_totals()
+        else:
+            pending.setdefault(self.order_id, self.order)
 
     def __str__(self):
         return f"{self.name} x {self.quantity}"
 
 
+class PaymentOTPManager(models.Manager):
+    def issue(self, order, ttl=timedelta(minutes=10)):
+        code = f"{secrets.randbelow(1000000):06d}"
+        # A new code keeps the attempts already used on this order, so resending
+        # never resets the max_attempts limit.
+        otp, _created = self.update_or_create(
+            order=order,
+            defaults={
+                "otp_code": code,
+                "is_verified": False,
+                "expires_at": timezone.now() + ttl,
+            },
+        )
+        return otp
+
+    def verify(self, order, code):
+        # One conditional UPDATE both consumes an attempt and records success, so
+        # concurrent submissions from several workers can never exceed max_attempts.
+        updated = self.filter(
+            order=order,
+            is_verified=False,
+            expires_at__gt=timezone.now(),
+            attempts__lt=F("max_attempts"),
+        ).update(
+            attempts=F("attempts") + 1,
+            is_verified=Case(When(otp_code=code, then=Value(True)), default=Value(False)),
+        )
+        otp = self.filter(order=order).first()
+        return bool(updated), otp
+
+
 class PaymentOTP(models.Model):
     order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name="payment_otp")
     otp_code = models.CharField(max_length=6)
@@ -110,7 +242,17 @@ class PaymentOTP(models.Model):
     max_attempts = models.PositiveIntegerField(default=3)
     is_verified = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
-    expires_at = models.DateTimeField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    objects = PaymentOTPManager()
+
+    @property
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
+
+    @property
+    def is_locked(self):
+        return not self.is_verified and (self.attempts >= self.max_attempts or self.is_expired)
 
     def __str__(self):
         return f"OTP for order {self.order_id}"
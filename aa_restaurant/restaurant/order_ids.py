@@ -0,0 +1,93 @@
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+
+BASE36_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+# Linux caps pids at 2**22, so a node can hold any pid in its worker slot range.
+PIDS_PER_NODE = 2 ** 22
+
+
+def to_base36(value, width):
+    chars = []
+    for _ in range(width):
+        value, remainder = divmod(value, 36)
+        chars.append(BASE36_ALPHABET[remainder])
+    if value:
+        raise ValueError("value does not fit in %d base36 digits" % width)
+    return "".join(reversed(chars))
+
+
+class TimeOrderedOrderIdGenerator:
+    # ORD + 8 chars of epoch milliseconds + 5 chars of worker id + 3 chars of
+    # per-millisecond sequence = 19 chars, inside Order.order_id's max_length.
+    prefix = "ORD"
+    time_width = 8
+    worker_width = 5
+    sequence_width = 3
+
+    def __init__(self, node_id=None):
+        if node_id is None:
+            node_id = int(getattr(settings, "ORDER_ID_NODE", 0))
+        max_nodes = 36 ** self.worker_width // PIDS_PER_NODE
+        if not 0 <= node_id < max_nodes:
+            raise ImproperlyConfigured("ORDER_ID_NODE must be between 0 and %d." % (max_nodes - 1))
+        self.node_id = node_id
+        self.max_sequence = 36 ** self.sequence_width - 1
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _reset(self, pid):
+        self._pid = pid
+        self._worker = to_base36(self.node_id * PIDS_PER_NODE + pid % PIDS_PER_NODE, self.worker_width)
+        self._last_ms = 0
+        self._sequence = 0
+
+    def __call__(self):
+        with self._lock:
+            pid = os.getpid()
+            if pid != self._pid:
+                self._reset(pid)
+
+            now_ms = time.time_ns() // 1000000
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._sequence = 0
+            elif self._sequence < self.max_sequence:
+                self._sequence += 1
+            else:
+                # Sequence exhausted for this millisecond: borrow the next one.
+                self._last_ms += 1
+                self._sequence = 0
+
+            return "".join(
+                (
+                    self.prefix,
+                    to_base36(self._last_ms, self.time_width),
+                    self._worker,
+                    to_base36(self._sequence, self.sequence_width),
+                )
+            )
+
+
+_generator = None
+_generator_lock = threading.Lock()
+
+
+def get_order_id_generator():
+    global _generator
+    if _generator is None:
+        with _generator_lock:
+            if _generator is None:
+                path = getattr(settings, "ORDER_ID_GENERATOR", "restaurant.order_ids.TimeOrderedOrderIdGenerator")
+                _generator = import_string(path)()
+    return _generator
+
+
+def new_order_id():
+    return get_order_id_generator()()
@@ -0,0 +1,100 @@
+import logging
+from contextlib import contextmanager
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+
+from .metrics import track_queries
+
+
+logger = logging.getLogger(__name__)
+
+TRANSACTION_STATEMENTS = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT", "BEGIN")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def _budget_mode():
+    return getattr(settings, "QUERY_BUDGET_MODE", "warn")
+
+
+def budgeted_statements(stats):
+    statements = {}
+    for (_alias, sql, _params), count in stats.statements.items():
+        if sql.lstrip().upper().startswith(TRANSACTION_STATEMENTS):
+            continue
+        statements[sql] = statements.get(sql, 0) + count
+    return statements
+
+
+def query_budget(max_queries):
+    # Put it above the other decorators so their queries (login_required's
+    # user lookup) count too.
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                mode = _budget_mode()
+                if mode == "off":
+                    return await view(request, *args, **kwargs)
+                with track_queries() as stats:
+                    response = await view(request, *args, **kwargs)
+                statements = budgeted_statements(stats)
+                if sum(statements.values()) > max_queries:
+                    _over_budget(f"{view.__module__}.{view.__qualname__}", statements, max_queries, mode)
+                return response
+
+            async_wrapper.query_budget = max_queries
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            mode = _budget_mode()
+            if mode == "off":
+                return view(request, *args, **kwargs)
+            with track_queries() as stats:
+                response = view(request, *args, **kwargs)
+            statements = budgeted_statements(stats)
+            if sum(statements.values()) > max_queries:
+                _over_budget(f"{view.__module__}.{view.__qualname__}", statements, max_queries, mode)
+            return response
+
+        wrapper.query_budget = max_queries
+        return wrapper
+
+    return decorator
+
+
+def _over_budget(name, statements, max_queries, mode):
+    listing = "\n".join(
+        f"  {count}x {sql}" for sql, count in sorted(statements.items(), key=lambda item: -item[1])[:10]
+    )
+    message = f"{name} ran {sum(statements.values())} queries (budget {max_queries}):\n{listing}"
+    if mode == "raise":
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+@contextmanager
+def assert_max_queries(max_queries, label="block"):
+    # Test helper: the same counting rules as @query_budget, always raising.
+    with track_queries() as stats:
+        yield stats
+    statements = budgeted_statements(stats)
+    if sum(statements.values()) > max_queries:
+        _over_budget(label, statements, max_queries, "raise")
+
+
+def views_without_budget(patterns):
+    missing = []
+    for pattern in patterns:
+        if hasattr(pattern, "url_patterns"):
+            missing.extend(views_without_budget(pattern.url_patterns))
+        elif getattr(pattern.callback, "query_budget", None) is None:
+            missing.append(pattern.name or str(pattern.pattern))
+    return missing
@@ -0,0 +1,66 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+# Catalog tables that are safe to read slightly stale.
+REPLICA_MODELS = {"restaurant.menuitem", "restaurant.category"}
+
+STICKY_SESSION_KEY = "db_primary_until"
+
+_reporting = ContextVar("replica_reporting", default=False)
+_request_state = ContextVar("replica_request_state", default=None)
+
+
+def replica_alias():
+    alias = getattr(settings, "DATABASE_REPLICA_ALIAS", None)
+    if not alias:
+        return None
+    state = _request_state.get()
+    if state is not None and state["pinned"]:
+        return None
+    return alias
+
+
+@contextmanager
+def replica_reads():
+    # Reporting queries (dashboard aggregates) may read any model from the replica.
+    token = _reporting.set(True)
+    try:
+        yield
+    finally:
+        _reporting.reset(token)
+
+
+@contextmanager
+def request_routing(pinned=False):
+    state = {"pinned": pinned, "wrote": False}
+    token = _request_state.set(state)
+    try:
+        yield state
+    finally:
+        _request_state.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower in REPLICA_MODELS or _reporting.get():
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None and model._meta.app_label == "restaurant":
+            # Read-your-writes: the rest of this request, and this visitor's next
+            # few requests, read from the primary.
+            state["pinned"] = True
+            state["wrote"] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, getattr(settings, "DATABASE_REPLICA_ALIAS", None)}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
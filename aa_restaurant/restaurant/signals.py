@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .menu_version import bump_menu_version
+from .metrics import install_query_recorder
+from .models import MenuItem
+from .thumbnails import refresh_image_variants
+
+
+# The version is bumped only once the edit is committed. A worker that saw
+# the new version earlier would load the old rows and cache them under it.
+@receiver(post_save, sender=MenuItem)
+def refresh_menu_item(sender, instance, raw=False, using=None, **kwargs):
+    if not raw and refresh_image_variants(instance):
+        MenuItem.objects.using(using).filter(pk=instance.pk).update(image_variants=instance.image_variants)
+    transaction.on_commit(bump_menu_version, using=using)
+
+
+@receiver(post_delete, sender=MenuItem)
+def invalidate_menu_cache(sender, using=None, **kwargs):
+    transaction.on_commit(bump_menu_version, using=using)
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    pragmas = getattr(settings, "SQLITE_PRAGMAS", None)
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+# Connected after apply_sqlite_pragmas, so the pragmas are not counted as queries.
+@receiver(connection_created)
+def record_connection_queries(sender, connection, **kwargs):
+    install_query_recorder(connection)
@@ -0,0 +1,158 @@
+import asyncio
+import json
+import mimetypes
+import os
+from wsgiref.util import FileWrapper
+
+from django.conf import settings
+
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Unhashed names can change in place, so browsers must revalidate them.
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+ENCODING_SUFFIXES = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _accepted_encodings(header):
+    accepted = set()
+    for part in (header or "").split(","):
+        coding, _sep, params = part.partition(";")
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticAsset:
+    __slots__ = ("content_type", "cache_control", "etag", "files")
+
+    def __init__(self, path, hashed):
+        stat = os.stat(path)
+        self.content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if self.content_type.startswith("text/") or self.content_type in ("application/javascript", "application/json"):
+            self.content_type += "; charset=utf-8"
+        self.cache_control = IMMUTABLE_CACHE_CONTROL if hashed else REVALIDATE_CACHE_CONTROL
+        self.etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        self.files = {None: (path, stat.st_size)}
+        for encoding, suffix in ENCODING_SUFFIXES:
+            if os.path.isfile(path + suffix):
+                self.files[encoding] = (path + suffix, os.path.getsize(path + suffix))
+
+    def select(self, accept_encoding):
+        accepted = _accepted_encodings(accept_encoding)
+        for encoding, _suffix in ENCODING_SUFFIXES:
+            if encoding in self.files and encoding in accepted:
+                return encoding, *self.files[encoding]
+        return None, *self.files[None]
+
+    def headers(self, encoding, size):
+        headers = [
+            ("Content-Type", self.content_type),
+            ("Cache-Control", self.cache_control),
+            ("ETag", self.etag),
+            ("Content-Length", str(size)),
+        ]
+        if len(self.files) > 1:
+            headers.append(("Vary", "Accept-Encoding"))
+        if encoding:
+            headers.append(("Content-Encoding", encoding))
+        return headers
+
+
+class StaticAssets:
+    # Index of STATIC_ROOT built once at start-up; collectstatic output does
+    # not change while the process runs.
+
+    def __init__(self, root=None, prefix=None):
+        self.root = str(root or settings.STATIC_ROOT)
+        self.prefix = prefix or settings.STATIC_URL
+        if not self.prefix.startswith("/"):
+            self.prefix = "/" + self.prefix
+
+        hashed = set()
+        manifest = os.path.join(self.root, "staticfiles.json")
+        if os.path.isfile(manifest):
+            with open(manifest, encoding="utf-8") as handle:
+                hashed = set(json.load(handle).get("paths", {}).values())
+
+        self.assets = {}
+        for directory, _dirs, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith((".gz", ".br")) or filename == "staticfiles.json":
+                    continue
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, self.root).replace(os.sep, "/")
+                self.assets[self.prefix + name] = StaticAsset(path, name in hashed)
+
+    def find(self, method, path):
+        if method not in ("GET", "HEAD") or not path.startswith(self.prefix):
+            return None
+        return self.assets.get(path)
+
+    def respond(self, asset, accept_encoding, if_none_match):
+        encoding, path, size = asset.select(accept_encoding)
+        headers = asset.headers(encoding, size)
+        if if_none_match and asset.etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return 304, [header for header in headers if header[0] != "Content-Length"], None
+        return 200, headers, path
+
+
+class StaticFilesWSGI:
+    def __init__(self, application, root=None, prefix=None):
+        self.application = application
+        self.static = StaticAssets(root, prefix)
+
+    def __call__(self, environ, start_response):
+        method = environ.get("REQUEST_METHOD", "GET")
+        asset = self.static.find(method, environ.get("PATH_INFO", ""))
+        if asset is None:
+            return self.application(environ, start_response)
+
+        status, headers, path = self.static.respond(
+            asset, environ.get("HTTP_ACCEPT_ENCODING"), environ.get("HTTP_IF_NONE_MATCH")
+        )
+        start_response("200 OK" if status == 200 else "304 Not Modified", headers)
+        if path is None or method == "HEAD":
+            return []
+        wrapper = environ.get("wsgi.file_wrapper", FileWrapper)
+        return wrapper(open(path, "rb"), 64 * 1024)
+
+
+def _read(path):
+    with open(path, "rb") as handle:
+        return handle.read()
+
+
+class StaticFilesASGI:
+    def __init__(self, application, root=None, prefix=None):
+        self.application = application
+        self.static = StaticAssets(root, prefix)
+
+    async def __call__(self, scope, receive, send):
+        asset = None
+        if scope["type"] == "http":
+            asset = self.static.find(scope["method"], scope["path"])
+        if asset is None:
+            return await self.application(scope, receive, send)
+
+        request_headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        status, headers, path = self.static.respond(
+            asset, request_headers.get("accept-encoding"), request_headers.get("if-none-match")
+        )
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [(key.lower().encode("latin-1"), value.encode("latin-1")) for key, value in headers],
+            }
+        )
+        body = b""
+        if path is not None and scope["method"] != "HEAD":
+            body = await asyncio.to_thread(_read, path)
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,45 @@
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # optional: gzip alone is still served
+    brotli = None
+
+
+COMPRESSIBLE_EXTENSIONS = {".css", ".js", ".mjs", ".json", ".map", ".svg", ".txt", ".html", ".xml", ".ico", ".ttf"}
+# Keep a compressed copy only when it saves at least this fraction of the bytes.
+MIN_SAVING = 0.05
+
+
+def compress_static_file(path):
+    with open(path, "rb") as source:
+        data = source.read()
+
+    written = []
+    candidates = [(".gz", lambda: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        candidates.append((".br", lambda: brotli.compress(data, quality=11)))
+    for suffix, compress in candidates:
+        compressed = compress()
+        if len(compressed) <= len(data) * (1 - MIN_SAVING):
+            with open(path + suffix, "wb") as target:
+                target.write(compressed)
+            written.append(path + suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # Content-hashed names (styles.3f2a9c.css) plus .gz/.br siblings, written
+    # once at collectstatic so the static handler never compresses per request.
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS and self.exists(name):
+                compress_static_file(self.path(name))
@@ -0,0 +1,49 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+
+register = template.Library()
+
+PLACEHOLDER_URL = "https://via.placeholder.com/400x250?text=Food"
+
+# Matches the menu grid: col-12 / col-sm-6 / col-md-4 / col-lg-3.
+MENU_CARD_SIZES = "(min-width: 992px) 25vw, (min-width: 768px) 33vw, (min-width: 576px) 50vw, 100vw"
+
+
+def _srcset(entries):
+    return ", ".join(f"{default_storage.url(name)} {width}w" for width, name in entries)
+
+
+@register.simple_tag
+def menu_image(item, css_class="card-img-top menu-img", sizes=MENU_CARD_SIZES):
+    variants = item.image_variants or {}
+    jpeg = variants.get("jpeg")
+    if not jpeg:
+        return format_html(
+            '<img src="{}" class="{}" alt="{}" loading="lazy" decoding="async">',
+            item.image_url or PLACEHOLDER_URL,
+            css_class,
+            item.name,
+        )
+
+    # Width/height of the largest variant let the browser reserve the box
+    # before the image arrives.
+    width, _name = jpeg[-1]
+    height = round(variants["height"] * width / variants["width"])
+    sources = format_html_join(
+        "",
+        '<source type="{}" srcset="{}" sizes="{}">',
+        [("image/webp", _srcset(variants["webp"]), sizes)] if variants.get("webp") else [],
+    )
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" class="{}" alt="{}" loading="lazy" decoding="async"></picture>',
+        sources,
+        default_storage.url(jpeg[0][1]),
+        _srcset(jpeg),
+        sizes,
+        width,
+        height,
+        css_class,
+        item.name,
+    )
@@ -0,0 +1,13 @@
+import tempfile
+
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    # The post_migrate warm-up links menu images and builds their thumbnails.
+    # Run it against an empty media directory, so creating the test database
+    # does not write variants into the real MEDIA_ROOT.
+    def setup_databases(self, **kwargs):
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            return super().setup_databases(**kwargs)
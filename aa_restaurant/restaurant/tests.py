@@ -1,2 +1,1191 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import runpy
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore as DatabaseSessionStore
+from django.contrib.sessions.models import Session
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.db.utils import ConnectionHandler
+from django.template import engines
+from django.test import AsyncClient, Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, resolve
+from django.utils import timezone
+from PIL import Image
+
+from . import views
+from .backends.mysql_pooled.pool import ConnectionPool
+from .catalog import reconcile_menu_images
+from .checks import check_menu_version_store
+from .events import InProcessBroker, event_stream, get_broker, order_channel
+from .image_index import ImageIndex, KeywordAutomaton, get_image_index
+from .management.commands.bench_funnel import ENDPOINTS, ClientDriver, _count_query, _run_funnel, compare
+from .menu_cache import MENU_CACHE_HITS_KEY, MENU_CACHE_MISSES_KEY, get_menu_fragment, menu_cache_stats
+from .menu_snapshot import get_menu_snapshot
+from .menu_version import bump_menu_version, get_menu_version
+from .metrics import QueryStats, registry, track_queries
+from .models import MenuItem, MenuVersion, Order, OrderItem, PaymentOTP, defer_order_totals
+from .query_budget import QueryBudgetExceeded, assert_max_queries, views_without_budget
+from .order_ids import TimeOrderedOrderIdGenerator
+from .routers import ReplicaRouter, replica_reads, request_routing
+from .static_handler import IMMUTABLE_CACHE_CONTROL, StaticFilesWSGI
+from .storage import compress_static_file
+from .templatetags.menu_images import menu_image
+from .urls import urlpatterns, with_async_views
+
+
+# Test transactions roll back menu version bumps that this process has
+# already remembered, so tests read the version on every call.
+_always_check_menu_version = override_settings(MENU_VERSION_CHECK_INTERVAL=0)
+
+
+def setUpModule():
+    _always_check_menu_version.enable()
+
+
+def tearDownModule():
+    _always_check_menu_version.disable()
+
+
+def create_menu_item(**fields):
+    # Tests create their own rows rather than rely on the post_migrate warm-up.
+    return MenuItem.objects.create(
+        **{"name": "Paneer Tikka", "category": MenuItem.CATEGORY_STARTERS, "price": Decimal("200.00"), **fields}
+    )
+
+
+class OrderIdGeneratorTests(SimpleTestCase):
+    def test_ids_are_unique_ordered_and_fit_the_column(self):
+        generator = TimeOrderedOrderIdGenerator()
+        ids = [generator() for _ in range(50000)]
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertEqual(ids, sorted(ids))
+        self.assertTrue(all(len(order_id) <= 20 and order_id.startswith("ORD") for order_id in ids))
+
+    def test_sequence_overflow_borrows_the_next_millisecond(self):
+        generator = TimeOrderedOrderIdGenerator()
+        with mock.patch("restaurant.order_ids.time.time_ns", return_value=1_700_000_000_000 * 1000000):
+            ids = [generator() for _ in range(generator.max_sequence + 2)]
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertEqual(ids, sorted(ids))
+
+    def test_workers_with_different_pids_do_not_collide(self):
+        generator = TimeOrderedOrderIdGenerator()
+        with mock.patch("restaurant.order_ids.time.time_ns", return_value=1_700_000_000_000 * 1000000):
+            with mock.patch("restaurant.order_ids.os.getpid", return_value=101):
+                first = generator()
+            with mock.patch("restaurant.order_ids.os.getpid", return_value=102):
+                second = generator()
+        self.assertNotEqual(first, second)
+
+
+class ImageIndexTests(SimpleTestCase):
+    def test_automaton_reports_every_keyword_in_one_pass(self):
+        automaton = KeywordAutomaton([("he", 1), ("she", 2), ("hers", 3), ("is", 4)])
+        self.assertEqual(sorted(value for _end, _length, value in automaton.matches("ushers_is")), [1, 2, 3, 4])
+        self.assertIn((6, 4, 3), list(automaton.matches("ushers_is")))
+
+    def test_exact_slug_then_longest_keyword(self):
+        index = ImageIndex(None, {"veg_fried_rice.jpg", "ice_cream.jpg", "butter_chicken.jpg"})
+        self.assertEqual(index.match("Butter Chicken"), "butter_chicken.jpg")
+        self.assertEqual(index.match("Veg Fried Rice (Large)"), "veg_fried_rice.jpg")
+        self.assertEqual(index.match("Special Butter Chicken"), "butter_chicken.jpg")
+        self.assertEqual(index.match("Vanilla Ice Cream Scoop"), "ice_cream.jpg")
+        self.assertIsNone(index.match("Paneer Tikka"))
+
+    def test_keywords_match_whole_words_only(self):
+        index = ImageIndex(None, {"ice_cream.jpg", "veg_fried_rice.jpg", "mango_juice.jpg"})
+        for name in ("Orange Juice", "Jeera Rice", "Licorice", "Juice Bar Special", "Rice Cream"):
+            self.assertIsNone(index.match(name), name)
+        self.assertEqual(index.match("Ice Gola"), "ice_cream.jpg")
+        self.assertEqual(index.match("Alphonso Mango Shake"), "mango_juice.jpg")
+
+    def test_index_is_rebuilt_when_the_directory_changes(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        directory = os.path.join(media_root, "menu_items")
+        os.mkdir(directory)
+        with override_settings(MEDIA_ROOT=media_root):
+            index = get_image_index()
+            self.assertIs(get_image_index(), index)
+            self.assertIsNone(index.match("Paneer Tikka"))
+
+            open(os.path.join(directory, "paneer_tikka.jpg"), "wb").close()
+            os.utime(directory, ns=(0, index.mtime[1] + 1))
+            self.assertEqual(get_image_index().match("Paneer Tikka"), "paneer_tikka.jpg")
+
+
+class MenuVersionTests(TestCase):
+    def test_menu_edits_bump_the_version_after_commit(self):
+        version = bump_menu_version()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            item = MenuItem.objects.create(name="Masala Dosa", category=MenuItem.CATEGORY_MAIN_COURSE, price=150)
+            self.assertEqual(get_menu_version(), version)
+        self.assertEqual(len(callbacks), 1)
+        self.assertNotEqual(get_menu_version(), version)
+
+        version = get_menu_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            MenuItem.objects.filter(pk=item.pk).delete()
+            self.assertEqual(get_menu_version(), version)
+        self.assertNotEqual(get_menu_version(), version)
+
+    def test_snapshot_follows_a_version_bumped_by_another_process(self):
+        item = create_menu_item()
+        self.assertEqual(get_menu_snapshot().get(item.pk).price, item.price)
+        # Another worker (or manage.py warm_menu) shares only the database with this one.
+        MenuItem.objects.filter(pk=item.pk).update(price=item.price + 1)
+        MenuVersion.objects.filter(pk=MenuVersion.SINGLETON_ID).update(version="other")
+        self.assertEqual(get_menu_snapshot().get(item.pk).price, item.price + 1)
+
+    @override_settings(MENU_VERSION_CHECK_INTERVAL=5)
+    def test_version_is_rechecked_after_the_interval(self):
+        bump_menu_version()
+        MenuVersion.objects.filter(pk=MenuVersion.SINGLETON_ID).update(version="other")
+        self.assertNotEqual(get_menu_version(), "other")
+        with mock.patch("restaurant.menu_version.time.monotonic", return_value=time.monotonic() + 5):
+            self.assertEqual(get_menu_version(), "other")
+
+    @override_settings(MENU_VERSION_CHECK_INTERVAL=5)
+    def test_cached_menu_reads_the_version_once(self):
+        bump_menu_version()
+        self.client.get("/menu/")
+        with self.assertNumQueries(0):
+            self.client.get("/menu/")
+
+        # Once the interval is up, a fragment miss checks the version once and loads the menu once.
+        MenuVersion.objects.filter(pk=MenuVersion.SINGLETON_ID).update(version="other")
+        with mock.patch("restaurant.menu_version.time.monotonic", return_value=time.monotonic() + 5):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get("/menu/")
+        tables = [query["sql"].split(" FROM ")[1].split()[0] for query in queries]
+        self.assertEqual(tables, ['"restaurant_menuversion"', '"restaurant_menuitem"'])
+
+    @override_settings(MENU_VERSION_STORE="cache")
+    def test_cache_store_needs_a_shared_cache(self):
+        self.assertEqual([error.id for error in check_menu_version_store(None)], ["restaurant.E001"])
+        shared = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": "redis://cache"}}
+        with override_settings(CACHES=shared):
+            self.assertEqual(check_menu_version_store(None), [])
+
+
+class MenuFragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.delete_many([MENU_CACHE_HITS_KEY, MENU_CACHE_MISSES_KEY])
+        bump_menu_version()
+        MenuItem.objects.create(name="Paneer Tikka", category=MenuItem.CATEGORY_STARTERS, price=200)
+
+    def stats(self):
+        stats = menu_cache_stats()
+        return stats["hits"], stats["misses"]
+
+    def test_first_render_misses_then_hits(self):
+        html = get_menu_fragment()
+        self.assertIn("Paneer Tikka", html)
+        self.assertEqual(self.stats(), (0, 1))
+        with mock.patch("restaurant.menu_cache.render_to_string") as render:
+            self.assertEqual(get_menu_fragment(), html)
+        render.assert_not_called()
+        self.assertEqual(self.stats(), (1, 1))
+
+    def test_bumping_the_version_invalidates_the_fragment(self):
+        get_menu_fragment()
+        with self.captureOnCommitCallbacks(execute=True):
+            MenuItem.objects.create(name="Masala Dosa", category=MenuItem.CATEGORY_MAIN_COURSE, price=150)
+        self.assertIn("Masala Dosa", get_menu_fragment())
+        self.assertEqual(self.stats(), (0, 2))
+
+
+class OrderTotalsTests(TestCase):
+    def setUp(self):
+        self.items = [
+            {"name": "Paneer Tikka", "category": "Starters", "price": Decimal("100.00"), "quantity": 2},
+            {"name": "Lassi", "category": "Beverages", "price": Decimal("50.00"), "quantity": 1},
+        ]
+
+    def count_update_totals(self):
+        patcher = mock.patch.object(Order, "update_totals", autospec=True, side_effect=Order.update_totals)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def test_create_with_items_inserts_all_lines_at_once(self):
+        update_totals = self.count_update_totals()
+        with CaptureQueriesContext(connection) as queries:
+            order = Order.objects.create_with_items(self.items, customer_name="A")
+        inserts = [query["sql"] for query in queries if query["sql"].startswith('INSERT INTO "restaurant_orderitem"')]
+        self.assertEqual(len(inserts), 1)
+        update_totals.assert_not_called()
+
+        order.refresh_from_db()
+        self.assertEqual((order.subtotal, order.delivery_fee, order.total), (Decimal("250.00"), Decimal("30.00"), Decimal("280.00")))
+        self.assertEqual(
+            sorted(order.items.values_list("name", "line_total")),
+            [("Lassi", Decimal("50.00")), ("Paneer Tikka", Decimal("200.00"))],
+        )
+
+    def test_deferred_totals_recalculate_each_order_once(self):
+        first = Order.objects.create_with_items(self.items[:1], customer_name="A")
+        second = Order.objects.create_with_items(self.items[1:], customer_name="B")
+        update_totals = self.count_update_totals()
+        with defer_order_totals():
+            OrderItem.objects.create(order=first, name="Naan", price=Decimal("20.00"), quantity=3)
+            with defer_order_totals():
+                OrderItem.objects.create(order=first, name="Roti", price=Decimal("10.00"), quantity=1)
+            OrderItem.objects.create(order=second, name="Kulfi", price=Decimal("40.00"), quantity=1)
+            update_totals.assert_not_called()
+            self.assertEqual(Order.objects.get(pk=first.pk).total, Decimal("230.00"))
+
+        self.assertEqual(sorted(call.args[0].pk for call in update_totals.call_args_list), [first.pk, second.pk])
+        self.assertEqual(Order.objects.get(pk=first.pk).total, Decimal("300.00"))
+        self.assertEqual(Order.objects.get(pk=second.pk).total, Decimal("120.00"))
+
+    def test_admin_inline_delete_recalculates_the_order_once(self):
+        order = Order.objects.create_with_items(
+            self.items, customer_name="A", customer_email="a@example.com", customer_phone="1", address="X", payment_method="COD"
+        )
+        kept, deleted = order.items.order_by("-name")
+        self.client.force_login(User.objects.create_superuser("root", password="pw"))
+        data = {
+            "order_id": order.order_id,
+            "customer_name": "A",
+            "customer_email": "a@example.com",
+            "customer_phone": "1",
+            "address": "X",
+            "instructions": "",
+            "payment_method": "COD",
+            "payment_status": order.payment_status,
+            "status": order.status,
+            "subtotal": "250.00",
+            "delivery_fee": "30.00",
+            "total": "280.00",
+            "items-TOTAL_FORMS": "2",
+            "items-INITIAL_FORMS": "2",
+            "items-MIN_NUM_FORMS": "0",
+            "items-MAX_NUM_FORMS": "1000",
+        }
+        for index, (line, quantity) in enumerate([(kept, 3), (deleted, 1)]):
+            data.update(
+                {
+                    f"items-{index}-id": line.pk,
+                    f"items-{index}-order": order.pk,
+                    f"items-{index}-name": line.name,
+                    f"items-{index}-category": line.category,
+                    f"items-{index}-price": line.price,
+                    f"items-{index}-quantity": quantity,
+                    f"items-{index}-line_total": line.line_total,
+                }
+            )
+        data["items-1-DELETE"] = "on"
+
+        update_totals = self.count_update_totals()
+        response = self.client.post(f"/admin/restaurant/order/{order.pk}/change/", data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(update_totals.call_count, 1)
+        order.refresh_from_db()
+        self.assertEqual(list(order.items.values_list("name", flat=True)), ["Paneer Tikka"])
+        self.assertEqual((order.subtotal, order.total), (Decimal("300.00"), Decimal("330.00")))
+
+
+class DatabaseSettingsTests(SimpleTestCase):
+    def load_settings(self, **env):
+        with mock.patch.dict(os.environ, {"USE_SQLITE": "1", "SQLITE_PROFILE": "tuned", **env}):
+            return runpy.run_path(str(settings.BASE_DIR / "aa_restaurant" / "settings.py"))
+
+    def conn_max_age(self, **env):
+        return self.load_settings(**env)["DATABASES"]["default"]["CONN_MAX_AGE"]
+
+    def test_tuned_sqlite_keeps_connections_under_wsgi(self):
+        self.assertEqual(self.conn_max_age(ASYNC_VIEWS="0", DJANGO_ASGI="0", DB_CONN_MAX_AGE="600"), 600)
+
+    def test_persistent_connections_are_off_under_asgi(self):
+        self.assertEqual(self.conn_max_age(ASYNC_VIEWS="0", DJANGO_ASGI="1", DB_CONN_MAX_AGE="600"), 0)
+        self.assertEqual(self.conn_max_age(ASYNC_VIEWS="1", DJANGO_ASGI="0"), 0)
+
+    def test_tuned_profile_opens_sqlite_files_in_wal_mode(self):
+        # The test database lives in memory, where WAL is not available: open a
+        # file under its own alias, with the pragmas of the tuned profile.
+        tuned = self.load_settings()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        database = {**tuned["DATABASES"]["default"], "NAME": os.path.join(directory, "db.sqlite3")}
+        wrapper = ConnectionHandler({DEFAULT_DB_ALIAS: {}, "wal_check": database})["wal_check"]
+        self.addCleanup(wrapper.close)
+        with override_settings(SQLITE_PRAGMAS=tuned["SQLITE_PRAGMAS"]), wrapper.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            self.assertEqual(cursor.fetchone()[0], "wal")
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+
+@override_settings(DATABASE_REPLICA_ALIAS="replica")
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def test_catalog_reads_go_to_the_replica(self):
+        self.assertEqual(self.router.db_for_read(MenuItem), "replica")
+        self.assertIsNone(self.router.db_for_read(Order))
+
+    def test_reporting_block_reads_orders_from_the_replica(self):
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Order), "replica")
+        self.assertIsNone(self.router.db_for_read(Order))
+
+    def test_writes_pin_the_rest_of_the_request_to_the_primary(self):
+        with request_routing() as state:
+            self.assertEqual(self.router.db_for_read(MenuItem), "replica")
+            self.assertEqual(self.router.db_for_write(Order), "default")
+            self.assertIsNone(self.router.db_for_read(MenuItem))
+        self.assertTrue(state["wrote"])
+
+    def test_sticky_requests_read_from_the_primary(self):
+        with request_routing(pinned=True), replica_reads():
+            self.assertIsNone(self.router.db_for_read(Order))
+
+    @override_settings(DATABASE_REPLICA_ALIAS=None)
+    def test_without_a_replica_everything_uses_the_primary(self):
+        self.assertIsNone(self.router.db_for_read(MenuItem))
+
+
+class FakeConnection:
+    def __init__(self, alive=True):
+        self.alive = alive
+        self.pings = 0
+        self.closed = False
+
+    def ping(self):
+        self.pings += 1
+        if not self.alive:
+            raise OSError("MySQL server has gone away")
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch("restaurant.backends.mysql_pooled.pool.time.monotonic", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pool = ConnectionPool(max_size=2, max_age=60, max_idle=10)
+
+    def connect(self, **kwargs):
+        connection = FakeConnection(**kwargs)
+        self.pool.add(connection)
+        return connection
+
+    def test_released_connections_are_reused(self):
+        self.assertIsNone(self.pool.acquire())
+        connection = self.connect()
+        self.pool.release(connection)
+        self.assertIs(self.pool.acquire(), connection)
+        self.assertIsNone(self.pool.acquire())
+        self.assertEqual(connection.pings, 0)
+        self.assertFalse(connection.closed)
+
+    def test_connections_beyond_max_size_are_closed(self):
+        connections = [self.connect() for _ in range(3)]
+        for connection in connections:
+            self.pool.release(connection)
+        self.assertEqual([connection.closed for connection in connections], [False, False, True])
+        self.assertEqual({self.pool.acquire(), self.pool.acquire()}, set(connections[:2]))
+        self.assertIsNone(self.pool.acquire())
+
+    def test_expired_connections_are_retired(self):
+        old = self.connect()
+        self.pool.release(old)
+        self.now += 60
+        self.assertIsNone(self.pool.acquire())
+        self.assertTrue(old.closed)
+
+        in_use = self.connect()
+        self.now += 60
+        self.pool.release(in_use)
+        self.assertTrue(in_use.closed)
+        self.assertIsNone(self.pool.acquire())
+
+    def test_idle_connections_are_pinged_before_reuse(self):
+        fresh = self.connect()
+        self.pool.release(fresh)
+        self.now += 5
+        self.assertIs(self.pool.acquire(), fresh)
+        self.assertEqual(fresh.pings, 0)
+
+        self.pool.release(fresh)
+        self.now += 10
+        self.assertIs(self.pool.acquire(), fresh)
+        self.assertEqual(fresh.pings, 1)
+
+    def test_dropped_idle_connections_are_discarded(self):
+        alive, dropped = self.connect(), self.connect(alive=False)
+        self.pool.release(alive)
+        self.pool.release(dropped)
+        self.now += 10
+        self.assertIs(self.pool.acquire(), alive)
+        self.assertEqual(dropped.pings, 1)
+        self.assertTrue(dropped.closed)
+        self.assertFalse(alive.closed)
+
+    def test_connections_from_before_a_fork_are_not_reused(self):
+        connection = self.connect()
+        self.pool.release(connection)
+        with mock.patch("restaurant.backends.mysql_pooled.pool.os.getpid", return_value=os.getpid() + 1):
+            self.assertIsNone(self.pool.acquire())
+            child = self.connect()
+            self.pool.release(child)
+            self.assertIs(self.pool.acquire(), child)
+        # The parent's socket is left alone: closing it here would close it for the parent too.
+        self.assertFalse(connection.closed)
+
+    def test_close_all_closes_idle_connections(self):
+        connections = [self.connect() for _ in range(2)]
+        for connection in connections:
+            self.pool.release(connection)
+        self.pool.close_all()
+        self.assertTrue(all(connection.closed for connection in connections))
+        self.assertIsNone(self.pool.acquire())
+
+
+@skipUnless(connection.vendor == "sqlite", "Query plans are checked against SQLite.")
+class QueryPlanTests(TestCase):
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(f"USING INDEX {index_name}", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_menu_snapshot_is_read_in_index_order(self):
+        self.assertUsesIndex(MenuItem.objects.order_by("category", "name"), "menuitem_category_name_idx")
+
+    def test_available_menu_is_read_in_index_order(self):
+        self.assertUsesIndex(
+            MenuItem.objects.filter(is_available=True).order_by("category", "name"),
+            "menuitem_category_name_idx",
+        )
+
+    def test_admin_menu_category_filter(self):
+        self.assertUsesIndex(
+            MenuItem.objects.filter(category=MenuItem.CATEGORY_DESSERTS).order_by("category", "name"),
+            "menuitem_category_name_idx",
+        )
+
+    def test_admin_order_filters(self):
+        cases = [
+            ({"status": "Pending"}, "order_status_created_idx"),
+            ({"payment_status": "Paid"}, "order_pay_status_created_idx"),
+            ({"payment_method": Order.PAYMENT_METHOD_GPAY}, "order_pay_method_created_idx"),
+        ]
+        for lookup, index_name in cases:
+            with self.subTest(**lookup):
+                self.assertUsesIndex(Order.objects.filter(**lookup).order_by("-created_at"), index_name)
+
+
+class MenuImageVariantTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override = override_settings(MEDIA_ROOT=media_root, MENU_THUMBNAIL_WIDTHS=(320, 640))
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def upload(self, width, height):
+        buffer = io.BytesIO()
+        Image.new("RGB", (width, height), "orange").save(buffer, "JPEG")
+        return SimpleUploadedFile("dish.jpg", buffer.getvalue(), content_type="image/jpeg")
+
+    def test_upload_generates_hashed_variants_without_upscaling(self):
+        item = MenuItem.objects.create(name="Dish", category=MenuItem.CATEGORY_STARTERS, description="", image=self.upload(500, 250))
+        item.refresh_from_db()
+        variants = item.image_variants
+        self.assertEqual(variants["source"], item.image.name)
+        self.assertEqual([width for width, _name in variants["webp"]], [320, 500])
+        self.assertEqual([width for width, _name in variants["jpeg"]], [320, 500])
+        self.assertRegex(variants["webp"][0][1], r"^menu_items/variants/dish[^/]*-320w\.[0-9a-f]{12}\.webp$")
+
+        html = menu_image(item)
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('loading="lazy"', html)
+        self.assertIn('width="500" height="250"', html)
+
+    def add_menu_image(self, filename):
+        directory = os.path.join(settings.MEDIA_ROOT, "menu_items")
+        os.makedirs(directory, exist_ok=True)
+        Image.new("RGB", (400, 200), "orange").save(os.path.join(directory, filename))
+
+    def test_reconciled_images_get_variants(self):
+        self.add_menu_image("paneer_tikka.jpg")
+        MenuItem.objects.all().delete()
+        item = MenuItem.objects.create(name="Paneer Tikka", category=MenuItem.CATEGORY_STARTERS, description="")
+
+        self.assertEqual(reconcile_menu_images(), 1)
+        item.refresh_from_db()
+        self.assertEqual(item.image.name, "menu_items/paneer_tikka.jpg")
+        self.assertEqual(item.image_variants["source"], item.image.name)
+        self.assertEqual([width for width, _name in item.image_variants["webp"]], [320, 400])
+
+    def test_warm_menu_command_is_idempotent_and_links_images(self):
+        self.add_menu_image("paneer_tikka.jpg")
+        MenuItem.objects.all().delete()
+
+        out = io.StringIO()
+        call_command("warm_menu", stdout=out)
+        self.assertIn("Seeded 8 menu item(s), linked 1 image(s).", out.getvalue())
+        item = MenuItem.objects.get(name="Paneer Tikka")
+        self.assertEqual(item.image.name, "menu_items/paneer_tikka.jpg")
+        self.assertEqual(item.image_variants["source"], item.image.name)
+
+        out = io.StringIO()
+        call_command("warm_menu", stdout=out)
+        self.assertIn("Seeded 0 menu item(s), linked 0 image(s).", out.getvalue())
+        self.assertEqual(MenuItem.objects.count(), 8)
+        self.assertEqual(MenuItem.objects.exclude(image="").count(), 1)
+
+    def test_items_without_variants_fall_back_to_a_lazy_img(self):
+        item = MenuItem(name="Dish", image_url="https://example.com/dish.jpg")
+        html = menu_image(item)
+        self.assertIn('src="https://example.com/dish.jpg"', html)
+        self.assertIn('loading="lazy"', html)
+
+
+class StaticFilesWSGITests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        os.mkdir(os.path.join(self.root, "css"))
+        for name in ("css/site.css", "css/site.0123456789ab.css"):
+            with open(os.path.join(self.root, name), "w") as handle:
+                handle.write("body { color: red; }\n" * 200)
+            compress_static_file(os.path.join(self.root, name))
+        with open(os.path.join(self.root, "staticfiles.json"), "w") as handle:
+            json.dump({"paths": {"css/site.css": "css/site.0123456789ab.css"}}, handle)
+
+        self.app_calls = []
+        self.handler = StaticFilesWSGI(self.fallback, root=self.root, prefix="/static/")
+
+    def fallback(self, environ, start_response):
+        self.app_calls.append(environ["PATH_INFO"])
+        start_response("404 Not Found", [])
+        return [b""]
+
+    def get(self, path, **headers):
+        environ = {"REQUEST_METHOD": "GET", "PATH_INFO": path, **headers}
+        response = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            response["status"] = status
+            response["headers"] = dict(response_headers)
+
+        response["body"] = b"".join(self.handler(environ, start_response))
+        return response
+
+    def test_hashed_files_are_precompressed_and_immutable(self):
+        response = self.get("/static/css/site.0123456789ab.css", HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response["status"], "200 OK")
+        self.assertEqual(response["headers"]["Content-Encoding"], "gzip")
+        self.assertEqual(response["headers"]["Cache-Control"], IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(int(response["headers"]["Content-Length"]), len(response["body"]))
+        self.assertLess(len(response["body"]), 4200)
+
+    def test_unhashed_files_revalidate_with_etag(self):
+        response = self.get("/static/css/site.css", HTTP_ACCEPT_ENCODING="gzip;q=0")
+        self.assertNotIn("Content-Encoding", response["headers"])
+        self.assertEqual(response["headers"]["Cache-Control"], "no-cache")
+        again = self.get("/static/css/site.css", HTTP_IF_NONE_MATCH=response["headers"]["ETag"])
+        self.assertEqual(again["status"], "304 Not Modified")
+        self.assertEqual(again["body"], b"")
+
+    def test_unknown_paths_fall_through_to_django(self):
+        self.get("/static/css/missing.css")
+        self.get("/menu/")
+        self.assertEqual(self.app_calls, ["/static/css/missing.css", "/menu/"])
+
+
+class FunnelBenchmarkTests(TestCase):
+    @override_settings(PAYMENT_OTP_DEMO=True)
+    def test_client_driver_walks_the_whole_funnel(self):
+        item = create_menu_item()
+        recorded = []
+        with connection.execute_wrapper(_count_query):
+            _run_funnel(ClientDriver(), item.pk, 2, lambda endpoint, elapsed, queries: recorded.append((endpoint, queries)))
+
+        endpoints = [endpoint for endpoint, _queries in recorded]
+        self.assertEqual(list(dict.fromkeys(endpoints)), list(ENDPOINTS))
+        self.assertEqual(endpoints.count("cart_increase"), 2)
+        self.assertGreater(dict(recorded)["payment_otp_issue"], 0)
+        order = Order.objects.get()
+        self.assertEqual((order.status, order.payment_status), ("Pending", "Paid"))
+
+    def test_compare_fails_on_extra_queries_but_tolerates_noise(self):
+        baseline = {"endpoints": {"menu": {"queries": 1.0, "p95_ms": 10.0, "rps": 100.0}}}
+        noisy = {"endpoints": {"menu": {"queries": 1.0, "p95_ms": 14.0, "rps": 80.0}}}
+        self.assertEqual(compare(noisy, baseline, tolerance=0.5), [])
+        slower = {"endpoints": {"menu": {"queries": 2.0, "p95_ms": 30.0, "rps": 40.0}}}
+        self.assertEqual(len(compare(slower, baseline, tolerance=0.5)), 3)
+
+
+@override_settings(
+    REQUEST_METRICS=True,
+    REQUEST_METRICS_TOKEN="",
+    MIDDLEWARE=["restaurant.metrics.RequestMetricsMiddleware", *settings.MIDDLEWARE],
+    TEMPLATES=[{**settings.TEMPLATES[0], "BACKEND": "restaurant.metrics.InstrumentedDjangoTemplates"}],
+)
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.item = create_menu_item()
+
+    def test_server_timing_reports_db_template_and_session(self):
+        self.client.post("/cart/increase/", {"item_id": self.item.pk})
+        response = self.client.get("/orders/")
+        timing = response["Server-Timing"]
+        self.assertRegex(timing, r"app;dur=[\d.]+")
+        self.assertRegex(timing, r"tpl;dur=[\d.]+")
+        self.assertRegex(timing, r'session;desc="read [1-9]\d* B, wrote 0 B"')
+
+        response = self.client.post("/cart/increase/", {"item_id": self.item.pk})
+        self.assertRegex(response["Server-Timing"], r'session;desc="read [1-9]\d* B, wrote [1-9]\d* B"')
+
+    def test_duplicate_queries_are_detected(self):
+        stats = QueryStats()
+        with track_queries(stats):
+            for _ in range(3):
+                list(Order.objects.filter(order_id="ORDMISSING"))
+            list(MenuItem.objects.all()[:1])
+        self.assertEqual((stats.count, stats.duplicates), (4, 2))
+        self.assertIn("restaurant_order", stats.most_repeated()[0])
+
+    def test_prometheus_endpoint_is_staff_only(self):
+        self.client.get("/menu/")
+        self.assertEqual(self.client.get("/metrics/").status_code, 403)
+
+        User.objects.create_user("ops", password="pw", is_staff=True)
+        self.client.login(username="ops", password="pw")
+        body = self.client.get("/metrics/").content.decode()
+        self.assertIn('restaurant_request_duration_seconds_count{view="restaurant:menu"} 1', body)
+        self.assertIn('restaurant_request_queries_total{view="restaurant:menu"}', body)
+
+
+@override_settings(QUERY_BUDGET_MODE="raise", PAYMENT_OTP_DEMO=True)
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        self.item = create_menu_item()
+        # A new menu version makes the first request refill the snapshot.
+        bump_menu_version()
+
+    def test_every_view_declares_a_budget(self):
+        self.assertEqual(views_without_budget(urlpatterns), [])
+        self.assertEqual(views_without_budget(with_async_views(urlpatterns)), [])
+
+    def test_customer_journey_stays_within_budget(self):
+        self.run_customer_journey()
+
+    def test_customer_journey_with_a_cold_session_cache_stays_within_budget(self):
+        # Every session read then goes to django_session, which budgets count.
+        caches = {**settings.CACHES, "sessions": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+        with override_settings(CACHES=caches):
+            self.run_customer_journey()
+
+    def test_session_and_menu_version_queries_count(self):
+        self.client.post("/cart/increase/", {"item_id": self.item.pk})
+        with self.assertRaisesMessage(QueryBudgetExceeded, "django_session"):
+            with assert_max_queries(0):
+                DatabaseSessionStore(self.client.session.session_key).load()
+        with self.assertRaisesMessage(QueryBudgetExceeded, "restaurant_menuversion"):
+            with assert_max_queries(0):
+                get_menu_version()
+
+    def run_customer_journey(self):
+        for url in ("/", "/menu/", "/cart/", "/cart/count/", "/contact/", "/orders/", "/login/", "/signup/"):
+            self.assertEqual(self.client.get(url).status_code, 200, url)
+        self.client.post("/cart/increase/", {"item_id": self.item.pk})
+        self.client.post("/cart/decrease/", {"item_id": self.item.pk})
+        self.client.post("/cart/increase/", {"item_id": self.item.pk})
+        self.client.get("/checkout/")
+        self.client.post("/checkout/", {"name": "A", "email": "a@example.com", "phone": "1", "address": "X", "paymentMethod": "GPay"})
+        code = self.client.post("/payment/otp/issue/").json()["otp"]
+        self.client.get("/otp/verify/")
+        self.assertTrue(self.client.post("/payment/otp/check/", {"otp": code}).json()["success"])
+        response = self.client.get("/place-order/")
+        self.assertEqual(self.client.get(response["Location"]).status_code, 200)
+        # Pages on base.html read the session for the cart badge.
+        for url in ("/", "/login-options/", "/contact/"):
+            self.assertEqual(self.client.get(url).status_code, 200, url)
+
+    def test_admin_pages_stay_within_budget(self):
+        Order.objects.create_with_items(
+            [{"menu_item_id": self.item.pk, "name": self.item.name, "category": "Starters", "price": self.item.price, "quantity": 2}],
+            customer_name="A",
+        )
+        User.objects.create_user("ops", password="pw", is_staff=True)
+        self.client.post("/admin-login/", {"username": "ops", "password": "pw"})
+        self.assertEqual(self.client.get("/admin-dashboard/").status_code, 200)
+        order = Order.objects.get()
+        self.client.get(f"/orders/{order.order_id}/")
+        self.client.get(f"/admin-order-status/{order.order_id}/Preparing/")
+
+    def test_over_budget_raises_with_the_statements(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, "3x SELECT"):
+            with assert_max_queries(2, "orders loop"):
+                for _ in range(3):
+                    list(Order.objects.filter(order_id="ORDMISSING"))
+
+    @override_settings(QUERY_BUDGET_MODE="warn")
+    def test_over_budget_view_only_logs_in_production(self):
+        render = views.render
+
+        def render_after_two_queries(*args, **kwargs):
+            list(Order.objects.all())
+            list(Order.objects.all())
+            return render(*args, **kwargs)
+
+        with mock.patch("restaurant.views.render", side_effect=render_after_two_queries):
+            with self.assertLogs("restaurant.query_budget", "WARNING") as logs:
+                self.assertEqual(self.client.get("/").status_code, 200)
+        self.assertIn("restaurant.views.home ran 2 queries (budget 1)", logs.output[0])
+
+
+class AsyncUrls:
+    # What restaurant.urls serves with ASYNC_VIEWS on (asgi.py).
+    urlpatterns = [path("", include((with_async_views(urlpatterns), "restaurant")))]
+
+
+@override_settings(QUERY_BUDGET_MODE="raise", ROOT_URLCONF=AsyncUrls)
+class AsyncCartApiTests(TestCase):
+    def setUp(self):
+        self.item = create_menu_item()
+        bump_menu_version()
+
+    async def click(self, client, action):
+        response = await client.post(f"/cart/{action}/", {"item_id": self.item.pk}, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    async def run_cart_api(self):
+        client = AsyncClient()
+        self.assertContains(await client.get("/menu/"), self.item.name)
+        self.assertEqual((await self.click(client, "increase"))["cart_count"], 1)
+        self.assertEqual((await self.click(client, "increase"))["quantity"], 2)
+        self.assertEqual((await client.get("/cart/count/")).json(), {"cart_count": 2})
+        self.assertEqual((await self.click(client, "decrease"))["cart_count"], 1)
+        self.assertEqual((await self.click(client, "remove"))["cart_count"], 0)
+
+    async def test_cart_api_under_asgi(self):
+        self.assertIs(resolve("/cart/increase/").func, views.acart_increase)
+        await self.run_cart_api()
+
+    @override_settings(SESSION_ENGINE="django.contrib.sessions.backends.db", MENU_VERSION_STORE="db")
+    async def test_cart_api_with_database_sessions(self):
+        # Sync session or ORM access from these views would raise SynchronousOnlyOperation.
+        await self.run_cart_api()
+
+    @override_settings(
+        DATABASE_REPLICA_ALIAS="default",
+        MIDDLEWARE=["restaurant.metrics.RequestMetricsMiddleware", *settings.MIDDLEWARE],
+    )
+    async def test_async_middlewares(self):
+        response = await AsyncClient().post("/cart/increase/", {"item_id": self.item.pk}, content_type="application/json")
+        self.assertRegex(response["Server-Timing"], r'session;desc="read 0 B, wrote [1-9]\d* B"')
+
+
+class EventStreamTests(TestCase):
+    def setUp(self):
+        self.item = create_menu_item()
+        bump_menu_version()
+        self.order = Order.objects.create_with_items(
+            [{"menu_item_id": self.item.pk, "name": self.item.name, "category": "Starters", "price": self.item.price, "quantity": 1}],
+            customer_name="A",
+        )
+        self.admin = Client()
+        self.admin.force_login(User.objects.create_user("ops", password="pw", is_staff=True))
+
+    async def next_event(self, stream):
+        return await asyncio.wait_for(anext(stream), 5)
+
+    async def add_to_cart(self, client):
+        response = await client.post("/cart/increase/", {"item_id": self.item.pk}, content_type="application/json")
+        return response.json()["cart_count"]
+
+    async def test_broker_delivers_across_threads_and_unsubscribes(self):
+        broker = InProcessBroker()
+        subscription = broker.subscribe(["a", "b"])
+        await asyncio.to_thread(broker.publish, "b", "order", {"status": "Delivered"})
+        self.assertEqual(await subscription.get(5), ("order", {"status": "Delivered"}))
+        self.assertEqual(broker.publish("other", "order", {}), 0)
+        subscription.close()
+        self.assertEqual(broker.publish("a", "cart", {}), 0)
+
+    async def test_stream_closes_its_subscription(self):
+        stream = event_stream([order_channel("ORDX")], initial=[("cart", {"cart_count": 0})])
+        self.assertEqual(await anext(stream), "retry: 5000\n\n")
+        self.assertEqual(await anext(stream), 'event: cart\ndata: {"cart_count": 0}\n\n')
+        self.assertEqual(get_broker().publish(order_channel("ORDX"), "order", {"status": "Preparing"}), 1)
+        self.assertIn('"Preparing"', await self.next_event(stream))
+        await stream.aclose()
+        self.assertEqual(get_broker().publish(order_channel("ORDX"), "order", {}), 0)
+
+    async def test_no_stream_under_wsgi(self):
+        client = AsyncClient()
+        await self.add_to_cart(client)
+        self.assertEqual((await client.get("/events/")).status_code, 204)
+        self.assertNotContains(await client.get("/menu/"), "data-events-url")
+
+    @override_settings(ASYNC_VIEWS=True)
+    async def test_stream_pushes_cart_count_and_order_status(self):
+        client = AsyncClient()
+        self.assertEqual((await client.get("/events/")).status_code, 204)
+        self.assertEqual(await self.add_to_cart(client), 1)
+        session = await client.asession()
+        await session.aset("order_ids", [self.order.order_id])
+        await session.asave()
+
+        response = await client.get("/events/")
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = response.streaming_content
+        self.assertEqual(await self.next_event(stream), b"retry: 5000\n\n")
+        self.assertEqual(await self.next_event(stream), b'event: cart\ndata: {"cart_count": 1}\n\n')
+
+        # Another tab adds an item; the admin marks the order as preparing.
+        self.assertEqual(await self.add_to_cart(client), 2)
+        self.assertEqual(await self.next_event(stream), b'event: cart\ndata: {"cart_count": 2}\n\n')
+        await sync_to_async(self.admin.get)(f"/admin-order-status/{self.order.order_id}/Preparing/")
+        self.assertEqual(
+            await self.next_event(stream),
+            f'event: order\ndata: {{"order_id": "{self.order.order_id}", "status": "Preparing"}}\n\n'.encode(),
+        )
+        self.assertContains(await client.get("/menu/"), 'data-events-url="/events/"')
+        await stream.aclose()
+
+
+class LegacySessionCartTests(TestCase):
+    def setUp(self):
+        self.item = create_menu_item()
+        bump_menu_version()
+        session = self.client.session
+        session["cart"] = {
+            str(self.item.pk): {"name": self.item.name, "price": str(self.item.price), "quantity": 2},
+            "99999": {"name": "Gone", "price": "10.00", "quantity": 1},
+            "abc": {"quantity": "x"},
+        }
+        session.save()
+
+    def test_count_reads_legacy_quantities(self):
+        self.assertEqual(self.client.get("/cart/count/").json(), {"cart_count": 3})
+
+    def test_cart_page_rewrites_the_cart_as_quantities(self):
+        self.assertEqual(self.client.get("/cart/").status_code, 200)
+        session = self.client.session
+        self.assertEqual(session["cart"], {str(self.item.pk): 2})
+        self.assertEqual(session["cart_count"], 2)
+        self.assertEqual(session["cart_menu_version"], get_menu_version())
+
+        response = self.client.post("/cart/increase/", {"item_id": self.item.pk}, content_type="application/json")
+        self.assertEqual(response.json()["cart_count"], 3)
+        self.assertEqual(self.client.session["cart"], {str(self.item.pk): 3})
+
+
+@override_settings(QUERY_BUDGET_MODE="raise")
+class LegacySessionOrderTests(TestCase):
+    def setUp(self):
+        self.item = create_menu_item()
+        bump_menu_version()
+        session = self.client.session
+        session["orders"] = [
+            {
+                "order_id": "ORD1700000000000",
+                "items": [
+                    {"id": self.item.pk, "name": self.item.name, "category": "Starters", "price": 120.0, "quantity": 2},
+                    {"id": 99999, "name": "Retired Dish", "category": "Desserts", "price": 35.5, "quantity": 1},
+                ],
+                "subtotal": 275.5,
+                "delivery_fee": 30.0,
+                "total": 305.5,
+                "created_at": "2024-01-02 03:04",
+                "status": "Delivered",
+                "payment_method": "GPay",
+                "payment_status": "Paid",
+                "customer": {"name": "A", "email": "a@example.com", "phone": "1", "address": "X"},
+            },
+            {"order_id": "ORD1700000000001", "items": [], "delivery_fee": 0, "payment_method": "COD", "customer": {}},
+            "not an order",
+        ]
+        session.save()
+
+    def test_orders_page_moves_legacy_orders_into_the_database(self):
+        response = self.client.get("/orders/")
+        self.assertEqual([order.order_id for order in response.context["orders"]], ["ORD1700000000001", "ORD1700000000000"])
+        order = Order.objects.get(order_id="ORD1700000000000")
+        self.assertEqual((order.subtotal, order.total, order.status, order.payment_status), (Decimal("275.50"), Decimal("305.50"), "Delivered", "Paid"))
+        self.assertEqual(order.created_at.strftime("%Y-%m-%d %H:%M"), "2024-01-02 03:04")
+        self.assertEqual(
+            list(order.items.order_by("name").values_list("name", "menu_item_id", "line_total")),
+            sorted([("Retired Dish", None, Decimal("35.50")), (self.item.name, self.item.pk, Decimal("240.00"))]),
+        )
+        session = self.client.session
+        self.assertNotIn("orders", session)
+        self.assertEqual(session["order_ids"], ["ORD1700000000000", "ORD1700000000001"])
+
+        self.client.get("/orders/")
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_order_detail_shows_a_legacy_order(self):
+        self.assertEqual(self.client.get("/orders/ORD1700000000000/").status_code, 200)
+
+    def test_checkout_keeps_legacy_orders(self):
+        self.client.post("/cart/increase/", {"item_id": self.item.pk})
+        self.client.post("/checkout/", {"name": "B", "email": "b@example.com", "phone": "2", "address": "Y", "paymentMethod": "COD"})
+        self.assertEqual(len(self.client.session["orders"]), 3)
+        self.assertEqual(len(self.client.get("/orders/").context["orders"]), 3)
+
+
+class CartApplyTests(TestCase):
+    def setUp(self):
+        self.item = create_menu_item()
+        bump_menu_version()
+
+    def apply(self, *operations, key=None):
+        body = {"operations": list(operations)}
+        if key is not None:
+            body["idempotency_key"] = key
+        response = self.client.post("/cart/apply/", body, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_rejects_deltas_that_are_not_plain_integers(self):
+        result = self.apply(
+            {"item_id": self.item.pk, "delta": 1.7},
+            {"item_id": self.item.pk, "delta": True},
+            {"item_id": self.item.pk, "delta": "2"},
+            {"item_id": "1e3", "delta": 1},
+            {"item_id": 99999, "delta": 1},
+            [self.item.pk, 1],
+        )
+        self.assertEqual(len(result["rejected"]), 6)
+        self.assertEqual((result["items"], result["cart_count"]), ({}, 0))
+        self.assertEqual(self.apply({"item_id": str(self.item.pk), "delta": 2})["cart_count"], 2)
+
+    def test_quantity_per_item_is_capped(self):
+        result = self.apply({"item_id": self.item.pk, "delta": 10**9})
+        self.assertEqual(result["items"], {str(self.item.pk): views.CART_MAX_ITEM_QUANTITY})
+        self.assertEqual(result["cart_count"], views.CART_MAX_ITEM_QUANTITY)
+        self.assertEqual(len(result["rejected"]), 1)
+
+        response = self.client.post("/cart/increase/", {"item_id": self.item.pk}, content_type="application/json")
+        self.assertEqual(response.json()["cart_count"], views.CART_MAX_ITEM_QUANTITY)
+        self.assertEqual(self.apply({"item_id": self.item.pk, "delta": -5})["cart_count"], views.CART_MAX_ITEM_QUANTITY - 5)
+
+    def test_replayed_idempotency_key_is_applied_once(self):
+        first = self.apply({"item_id": self.item.pk, "delta": 3}, key="k1")
+        self.assertEqual(self.apply({"item_id": self.item.pk, "delta": 3}, key="k1"), first)
+        self.assertEqual(self.apply({"item_id": self.item.pk, "delta": 1}, key="k2")["cart_count"], 4)
+        self.assertEqual(self.client.get("/cart/count/").json(), {"cart_count": 4})
+
+
+@override_settings(QUERY_BUDGET_MODE="raise")
+class PaymentOTPTests(TestCase):
+    def setUp(self):
+        item = create_menu_item()
+        bump_menu_version()
+        self.order = Order.objects.create_with_items(
+            [{"menu_item_id": item.pk, "name": item.name, "category": item.category, "price": item.price, "quantity": 1}],
+            customer_name="A",
+            payment_method=Order.PAYMENT_METHOD_GPAY,
+            status=Order.STATUS_AWAITING_PAYMENT,
+        )
+        self.item = item
+        self.otp = PaymentOTP.objects.issue(self.order)
+        session = self.client.session
+        session["pending_order"] = {"order_id": self.order.order_id, "customer": {"name": "A"}, "payment_method": "GPay"}
+        session["cart"] = {str(item.pk): 1}
+        session.save()
+
+    def verify(self, code):
+        return self.client.post("/payment/otp/check/", {"otp": code}, content_type="application/json").json()
+
+    def issue(self):
+        response = self.client.post("/payment/otp/issue/")
+        self.otp.refresh_from_db()
+        return response
+
+    def wrong_code(self):
+        return f"{(int(self.otp.otp_code) + 1) % 1000000:06d}"
+
+    def status(self):
+        return Order.objects.values_list("status", flat=True).get(pk=self.order.pk)
+
+    def test_wrong_code_uses_an_attempt(self):
+        result = self.verify(self.wrong_code())
+        self.assertEqual((result["success"], result["attempts"]), (False, 1))
+        self.assertNotIn("redirect", result)
+        self.assertEqual(self.status(), Order.STATUS_AWAITING_PAYMENT)
+        self.assertTrue(self.verify(self.otp.otp_code)["success"])
+        self.assertRedirects(
+            self.client.get("/place-order/"), f"/orders/{self.order.order_id}/", fetch_redirect_response=False
+        )
+        self.assertEqual(self.status(), "Pending")
+
+    def test_attempt_limit_fails_the_order(self):
+        for _ in range(self.otp.max_attempts):
+            result = self.verify(self.wrong_code())
+        self.assertEqual(result["redirect"], "/payment/failed/")
+        self.assertEqual(self.status(), Order.STATUS_PAYMENT_FAILED)
+        result = self.verify(self.otp.otp_code)
+        self.assertEqual((result["success"], result["attempts"]), (False, self.otp.max_attempts))
+
+    def test_expired_code_is_refused(self):
+        PaymentOTP.objects.filter(pk=self.otp.pk).update(expires_at=timezone.now())
+        result = self.verify(self.otp.otp_code)
+        self.assertEqual((result["success"], result["attempts"], result["redirect"]), (False, 0, "/payment/failed/"))
+        self.assertEqual(self.status(), Order.STATUS_PAYMENT_FAILED)
+
+    def test_resending_keeps_the_attempts_used(self):
+        self.verify(self.wrong_code())
+        self.verify(self.wrong_code())
+        response = self.issue()
+        self.assertEqual(response.json()["attempts"], 2)
+        self.assertEqual(PaymentOTP.objects.get().attempts, 2)
+        result = self.verify(self.wrong_code())
+        self.assertEqual(result["redirect"], "/payment/failed/")
+        self.assertEqual(self.status(), Order.STATUS_PAYMENT_FAILED)
+
+    @override_settings(PAYMENT_OTP_MAX_ISSUES=2)
+    def test_codes_per_checkout_are_capped(self):
+        self.assertEqual(self.issue().status_code, 200)
+        self.assertEqual(self.issue().status_code, 200)
+        self.assertEqual(self.issue().status_code, 429)
+
+    def test_issue_reprices_the_order_when_the_cart_changed(self):
+        session = self.client.session
+        session["cart"] = {str(self.item.pk): 3}
+        session.save()
+        self.assertEqual(self.issue().status_code, 200)
+        self.assertEqual(Order.objects.count(), 1)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.subtotal, self.item.price * 3)
+        self.assertEqual(list(self.order.items.values_list("quantity", flat=True)), [3])
+
+        session = self.client.session
+        session["cart"] = {}
+        session.save()
+        self.assertEqual(self.issue().status_code, 400)
+
+    def test_issue_and_verify_need_the_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        client.cookies = self.client.cookies
+        self.assertEqual(client.post("/payment/otp/issue/").status_code, 403)
+        self.assertEqual(client.post("/payment/otp/check/", {"otp": self.otp.otp_code}).status_code, 403)
+
+        client.get("/otp/verify/")
+        token = client.cookies["csrftoken"].value
+        self.assertEqual(client.post("/payment/otp/issue/", HTTP_X_CSRFTOKEN=token).status_code, 200)
+
+    def test_purge_keeps_verified_codes(self):
+        self.assertTrue(self.verify(self.otp.otp_code)["success"])
+        PaymentOTP.objects.filter(pk=self.otp.pk).update(expires_at=timezone.now())
+        call_command("purge_expired_otps", stdout=io.StringIO())
+        self.assertTrue(PaymentOTP.objects.filter(pk=self.otp.pk).exists())
+        self.assertEqual(self.status(), Order.STATUS_AWAITING_PAYMENT)
+
+        self.assertRedirects(
+            self.client.get("/place-order/"), f"/orders/{self.order.order_id}/", fetch_redirect_response=False
+        )
+
+    def test_purge_fails_orders_with_expired_unverified_codes(self):
+        PaymentOTP.objects.filter(pk=self.otp.pk).update(expires_at=timezone.now())
+        call_command("purge_expired_otps", stdout=io.StringIO())
+        self.assertFalse(PaymentOTP.objects.exists())
+        self.assertEqual(self.status(), Order.STATUS_PAYMENT_FAILED)
+
+    def test_admin_dashboard_ignores_unplaced_orders(self):
+        self.client.force_login(User.objects.create_user("ops", password="pw", is_staff=True))
+        response = self.client.get("/admin-dashboard/")
+        self.assertEqual((response.context["orders"], response.context["total_orders"]), ([], 0))
+        self.client.get(f"/admin-order-status/{self.order.order_id}/Delivered/")
+        self.assertEqual(self.status(), Order.STATUS_AWAITING_PAYMENT)
+
+
+class AdminDashboardTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user("ops", password="pw", is_staff=True))
+        Order.objects.bulk_create(Order(customer_name=f"Customer {n}", subtotal=100, total=100) for n in range(60))
+        # Three orders per timestamp, so pages also break inside a run of equal times.
+        start = timezone.now()
+        for n, pk in enumerate(Order.objects.order_by("pk").values_list("pk", flat=True)):
+            Order.objects.filter(pk=pk).update(created_at=start - timedelta(seconds=n // 3))
+
+    def test_cursor_pages_neither_overlap_nor_skip_orders(self):
+        pages = []
+        url = "/admin-dashboard/"
+        while url:
+            response = self.client.get(url)
+            pages.append([order.pk for order in response.context["orders"]])
+            cursor = response.context["next_cursor"]
+            url = f"/admin-dashboard/?before={cursor}" if cursor else None
+
+        self.assertEqual([len(page) for page in pages], [views.DASHBOARD_PAGE_SIZE, views.DASHBOARD_PAGE_SIZE, 10])
+        expected = list(Order.objects.order_by("-created_at", "-id").values_list("pk", flat=True))
+        self.assertEqual([pk for page in pages for pk in page], expected)
+
+
+class OrderAccessTests(TestCase):
+    def setUp(self):
+        self.order = Order.objects.create_with_items([], customer_name="A", payment_method="COD")
+        self.url = f"/orders/{self.order.order_id}/"
+        session = self.client.session
+        session["order_ids"] = [self.order.order_id]
+        session.save()
+
+    def test_the_ordering_session_sees_its_order(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_another_session_gets_a_404(self):
+        other = Client()
+        response = other.get(self.url)
+        self.assertEqual(response.status_code, 404)
+        self.assertTemplateUsed(response, "restaurant/order_not_found.html")
+        self.assertEqual(list(other.get("/orders/").context["orders"]), [])
+
+    def test_staff_can_open_any_order(self):
+        staff = Client()
+        staff.force_login(User.objects.create_user("ops", password="pw", is_staff=True))
+        self.assertEqual(staff.get(self.url).status_code, 200)
+
+
+class CartCountContextTests(SimpleTestCase):
+    def render(self, source):
+        request = RequestFactory().get("/")
+        request.session = {}
+        return engines["django"].from_string(source).render({}, request)
+
+    def test_cart_count_is_only_read_by_templates_that_use_it(self):
+        with mock.patch("restaurant.context_processors.session_cart_count", return_value=3) as count:
+            self.assertEqual(self.render("menu"), "menu")
+            count.assert_not_called()
+            self.assertEqual(self.render("cart ({{ cart_count }})"), "cart (3)")
+            count.assert_called_once()
+
+
+class PurgeSessionsTests(TestCase):
+    def test_only_expired_sessions_are_deleted_in_chunks(self):
+        now = timezone.now()
+        Session.objects.bulk_create(
+            [Session(session_key=f"expired{n}", session_data="", expire_date=now - timedelta(days=1)) for n in range(5)]
+            + [Session(session_key=f"live{n}", session_data="", expire_date=now + timedelta(days=1)) for n in range(3)]
+        )
+        out = io.StringIO()
+        call_command("purge_sessions", "--chunk-size", "2", stdout=out)
+        self.assertIn("Deleted 5 expired session(s).", out.getvalue())
+        self.assertEqual(sorted(Session.objects.values_list("session_key", flat=True)), ["live0", "live1", "live2"])
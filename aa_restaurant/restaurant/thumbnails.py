@@ -0,0 +1,82 @@
+import hashlib
+import io
+import logging
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+
+logger = logging.getLogger(__name__)
+
+VARIANT_DIRECTORY = "menu_items/variants"
+VARIANT_FORMATS = {
+    "webp": ("WEBP", "webp", {"quality": 75, "method": 6}),
+    "jpeg": ("JPEG", "jpg", {"quality": 80, "optimize": True, "progressive": True}),
+}
+
+
+def thumbnail_widths():
+    return sorted(getattr(settings, "MENU_THUMBNAIL_WIDTHS", (320, 640, 960)))
+
+
+def _target_widths(source_width):
+    widths = thumbnail_widths()
+    # Never upscale: keep the smaller widths plus one variant at (at most) full size.
+    targets = {width for width in widths if width < source_width}
+    targets.add(min(source_width, widths[-1]))
+    return sorted(targets)
+
+
+def variants_are_current(item):
+    return bool(item.image) and (item.image_variants or {}).get("source") == item.image.name
+
+
+def generate_image_variants(image_file, storage=default_storage):
+    image_file.open("rb")
+    try:
+        data = image_file.read()
+    finally:
+        image_file.close()
+
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    stem = os.path.splitext(os.path.basename(image_file.name))[0]
+
+    with Image.open(io.BytesIO(data)) as source:
+        source = ImageOps.exif_transpose(source).convert("RGB")
+        variants = {
+            "source": image_file.name,
+            "width": source.width,
+            "height": source.height,
+        }
+        for width in _target_widths(source.width):
+            height = max(1, round(source.height * width / source.width))
+            resized = source if width == source.width else source.resize((width, height), Image.LANCZOS)
+            for key, (pillow_format, extension, options) in VARIANT_FORMATS.items():
+                # The name carries the source hash, so a replaced photo gets new
+                # URLs and the old ones can be cached forever.
+                name = f"{VARIANT_DIRECTORY}/{stem}-{width}w.{digest}.{extension}"
+                if not storage.exists(name):
+                    buffer = io.BytesIO()
+                    resized.save(buffer, pillow_format, **options)
+                    name = storage.save(name, ContentFile(buffer.getvalue()))
+                variants.setdefault(key, []).append([width, name])
+    return variants
+
+
+def refresh_image_variants(item, force=False):
+    if not item.image:
+        if not item.image_variants:
+            return False
+        item.image_variants = {}
+        return True
+    if not force and variants_are_current(item):
+        return False
+    try:
+        item.image_variants = generate_image_variants(item.image)
+    except (OSError, ValueError):
+        logger.exception("Could not generate thumbnails for menu item %s", item.pk)
+        return False
+    return True
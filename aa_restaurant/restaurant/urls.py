@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
@@ -7,16 +8,20 @@ app_name = "restaurant"
 urlpatterns = [
     path("", views.home, name="home"),
     path("menu/", views.menu, name="menu"),
+    path("menu/cache-stats/", views.menu_cache_stats_api, name="menu_cache_stats"),
+    path("metrics/", views.request_metrics, name="request_metrics"),
     path("cart/", views.cart, name="cart"),
     path("login/", views.customer_login, name="customer_login"),
     path("admin-login/", views.admin_login, name="admin_login"),
     path("admin-dashboard/", views.admin_dashboard, name="admin_dashboard"),
     path("admin-order-status/<str:order_id>/<str:new_status>/", views.update_order_status, name="update_order_status"),
     path("orders/<str:order_id>/", views.order_detail, name="order_detail"),
+    path("events/", views.events, name="events"),
     path("cart/count/", views.cart_count_api, name="cart_count_api"),
     path("cart/increase/", views.cart_increase, name="cart_increase"),
     path("cart/decrease/", views.cart_decrease, name="cart_decrease"),
     path("cart/remove/", views.cart_remove, name="cart_remove"),
+    path("cart/apply/", views.cart_apply, name="cart_apply"),
     path("checkout/", views.checkout, name="checkout"),
     path("orders/", views.orders, name="orders"),
     path("contact/", views.contact, name="contact"),
@@ -25,6 +30,28 @@ urlpatterns = [
 
     path("payment/confirm/", views.payment_confirmation, name="payment_confirm"),
     path("otp/verify/", views.otp_verification, name="otp_verification"),
+    path("payment/otp/issue/", views.payment_otp_issue, name="payment_otp_issue"),
+    path("payment/otp/check/", views.payment_otp_verify, name="payment_otp_verify"),
     path("payment/failed/", views.payment_failed, name="payment_failed"),
     path("place-order/", views.place_order, name="place_order"),
 ]
+
+# Native async versions, served under ASGI (settings.ASYNC_VIEWS).
+ASYNC_VIEWS = {
+    "menu": views.amenu,
+    "cart_count_api": views.acart_count_api,
+    "cart_increase": views.acart_increase,
+    "cart_decrease": views.acart_decrease,
+    "cart_remove": views.acart_remove,
+}
+
+
+def with_async_views(patterns):
+    return [
+        path(str(pattern.pattern), ASYNC_VIEWS[pattern.name], name=pattern.name) if pattern.name in ASYNC_VIEWS else pattern
+        for pattern in patterns
+    ]
+
+
+if settings.ASYNC_VIEWS:
+    urlpatterns = with_async_views(urlpatterns)
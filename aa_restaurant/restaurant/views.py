@@ -1,6 +1,6 @@
+import calendar
 import json
-import os
-import time
+from datetime import datetime, timedelta, timezone as dt_timezone
 from decimal import Decimal
 from django.contrib.auth.models import User
 from django.contrib import messages
@@ -8,86 +8,36 @@ from django.contrib import messages
 from django.conf import settings
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.db.models import Sum, Q
-from django.http import JsonResponse, Http404
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.http import HttpResponse, JsonResponse, Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, render, redirect
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.safestring import mark_safe
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 
-from .models import MenuItem, Order
+from .cart import asession_cart_count, cart_quantity, count_cart_items, session_cart_count
+from .events import event_stream, order_channel, publish_cart_count, publish_order_status, session_channel
+from .menu_cache import aget_menu_fragment, get_menu_fragment, menu_cache_stats
+from .menu_snapshot import aget_menu_snapshot, get_menu_snapshot
+from .metrics import registry as metrics_registry
+from .models import MenuItem, Order, OrderItem, PaymentOTP
+from .query_budget import query_budget
+from .routers import replica_reads
 
 
-IMAGE_NAME_MAP = [
-    ("paneer", "paneer_tikka.jpg"),
-    ("biryani", "chicken_biryani.jpg"),
-    ("mango", "mango_juice.jpg"),
-    ("cool", "cool_drink.jpg"),
-    ("gulab", "gulab_jamun.jpg"),
-    ("ice", "ice_cream.jpg"),
-    ("manchuria", "veg_manchuria.jpg"),
-    ("fried rice", "veg_fried_rice.jpg"),
-
-
-    ("chocolate", "chocolate_lava_cake.jpg"),
-]
-
-
-
-
-def _image_path_for_menu_name(name):
-    value = (name or "").lower()
-    for key, filename in IMAGE_NAME_MAP:
-        if key in value:
-            return "menu_items/" + filename
-    return None
-
-
-def _ensure_menu_item_images():
-    media_root = getattr(settings, "MEDIA_ROOT", None)
-    if not media_root:
-        return
-
-    directory = os.path.join(media_root, "menu_items")
-    if not os.path.isdir(directory):
-        return
-
-    def _slug(value):
-        value = (value or "").strip().lower()
-        if not value:
-            return ""
-        parts = []
-        prev_underscore = False
-        for ch in value:
-            if ch.isalnum():
-                parts.append(ch)
-                prev_underscore = False
-            else:
-                if not prev_underscore:
-                    parts.append("_")
-                    prev_underscore = True
-        slug = "".join(parts).strip("_")
-        return slug
-
-    filenames = os.listdir(directory)
-    file_map = {}
-    for name in filenames:
-        base, _ext = os.path.splitext(name)
-        slug = _slug(base)
-        if slug and slug not in file_map:
-            file_map[slug] = name
-
-    for item in MenuItem.objects.all():
-        if item.image:
-            continue
-        slug = _slug(item.name)
-        if not slug:
-            continue
-        filename = file_map.get(slug)
-        if filename:
-            item.image = "menu_items/" + filename
-            item.save(update_fields=["image"])
+SESSION_ORDER_HISTORY_LIMIT = 50
+CART_APPLY_MAX_OPERATIONS = 50
+CART_MAX_ITEM_QUANTITY = 20
+CART_APPLY_REMEMBERED_KEYS = 10
+DASHBOARD_PAGE_SIZE = 25
 
 
+@query_budget(1)
 def home(request):
     return render(request, "restaurant/home.html")
 
@@ -96,6 +46,7 @@ def choose_login(request):
     return render(request, "restaurant/choose_login.html")
 
 
+@query_budget(4)
 def signup(request):
     if request.method == "POST":
         username = (request.POST.get("username") or "").strip()
@@ -124,103 +75,25 @@ def signup(request):
 
     return render(request, "restaurant/signup.html")
 
+
+@query_budget(3)
 def menu(request):
-    if not MenuItem.objects.exists():
-        sample_items = [
-            {
-                "name": "Paneer Tikka",
-                "category": MenuItem.CATEGORY_STARTERS,
-                "price": 200,
-                "description": "Marinated paneer cubes grilled with spices.",
-                "rating": 4.5,
-                "is_popular": True,
-                "image_url": "https://images.unsplash.com/photo-1604908176997-1251884b08a7",
-                "is_available": True,
-            },
-            {
-                "name": "Veg Manchuria",
-                "category": MenuItem.CATEGORY_STARTERS,
-                "price": 180,
-                "description": "Crispy vegetable balls tossed in tangy sauce.",
-                "rating": 4.3,
-                "is_popular": False,
-                "image_url": "https://images.unsplash.com/photo-1604908176997-1251884b08a7",
-                "is_available": True,
-            },
-            {
-                "name": "Chicken Biryani",
-                "category": MenuItem.CATEGORY_MAIN_COURSE,
-                "price": 260,
-                "description": "Fragrant basmati rice cooked with spiced chicken.",
-                "rating": 4.6,
-                "is_popular": True,
-                "image_url": "https://images.unsplash.com/photo-1604908176997-1251884b08a7",
-                "is_available": True,
-            },
-            {
-                "name": "Veg Fried Rice",
-                "category": MenuItem.CATEGORY_MAIN_COURSE,
-                "price": 220,
-                "description": "Stir fried rice with mixed vegetables and sauces.",
-                "rating": 4.2,
-                "is_popular": False,
-                "image_url": "https://images.unsplash.com/photo-1604908176997-1251884b08a7",
-                "is_available": True,
-            },
-            {
-                "name": "Mango Juice",
-                "category": MenuItem.CATEGORY_BEVERAGES,
-                "price": 90,
-                "description": "Refreshing chilled mango juice.",
-                "rating": 4.4,
-                "is_popular": False,
-                "image_url": "https://images.unsplash.com/photo-1577801596755-03888a34ec6c",
-                "is_available": True,
-            },
-            {
-                "name": "Cool Drink",
-                "category": MenuItem.CATEGORY_BEVERAGES,
-                "price": 60,
-                "description": "Carbonated soft drink served chilled.",
-                "rating": 4.1,
-                "is_popular": False,
-                "image_url": "https://images.unsplash.com/photo-1541976076758-25a71c0b2f2d",
-                "is_available": True,
-            },
-            {
-                "name": "Gulab Jamun",
-                "category": MenuItem.CATEGORY_DESSERTS,
-                "price": 120,
-                "description": "Soft milk dumplings soaked in sugar syrup.",
-                "rating": 4.7,
-                "is_popular": True,
-                "image_url": "https://images.unsplash.com/photo-1606491956689-2ea866880c84",
-                "is_available": True,
-            },
-            {
-                "name": "Ice Cream",
-                "category": MenuItem.CATEGORY_DESSERTS,
-                "price": 100,
-                "description": "Creamy vanilla ice cream scoop.",
-                "rating": 4.3,
-                "is_popular": False,
-                "image_url": "https://images.unsplash.com/photo-1501446529957-6226bd447c46",
-                "is_available": True,
-            },
-        ]
-        for data in sample_items:
-            MenuItem.objects.create(**data)
-
-    _ensure_menu_item_images()
-
-    items = MenuItem.objects.filter(is_available=True).order_by("category", "name")
-    context = {"items": items}
+    context = {"menu_items_html": mark_safe(get_menu_fragment())}
+    return render(request, "restaurant/menu.html", context)
+
+
+@query_budget(3)
+async def amenu(request):
+    context = {"menu_items_html": mark_safe(await aget_menu_fragment())}
+    # Load the session now: the cart badge context processor reads it synchronously.
+    await request.session.aget("cart_count")
     return render(request, "restaurant/menu.html", context)
 
 
+@query_budget(3)
 def cart(request):
     cart = _get_session_cart(request)
-    items, subtotal = _cart_items_with_totals(cart)
+    items, subtotal = _cart_items_with_totals(cart, _menu_snapshot(request))
 
     delivery_fee = Decimal("30.00") if subtotal > 0 else Decimal("0.00")
     total = subtotal + delivery_fee
@@ -234,9 +107,10 @@ def cart(request):
     return render(request, "restaurant/cart.html", context)
 
 
+@query_budget(5)
 def checkout(request):
     cart = _get_session_cart(request)
-    items, subtotal = _cart_items_with_totals(cart)
+    items, subtotal = _cart_items_with_totals(cart, _menu_snapshot(request))
     delivery_fee = Decimal("30.00") if subtotal > 0 else Decimal("0.00")
     total = subtotal + delivery_fee
 
@@ -260,10 +134,11 @@ def checkout(request):
         }
 
         if payment_method == "COD":
-            order_id = _create_session_order(request, customer, payment_method, is_online=False)
-            if not order_id:
+            order = _create_order(request, customer, payment_method)
+            if order is None:
                 return redirect("restaurant:cart")
-            return redirect("restaurant:order_detail", order_id=order_id)
+            _remember_order(request, order.order_id)
+            return redirect("restaurant:order_detail", order_id=order.order_id)
 
         request.session["pending_order"] = {
             "customer": customer,
@@ -281,94 +156,213 @@ def checkout(request):
     return render(request, "restaurant/checkout.html", context)
 
 
+@query_budget(8)
 def orders(request):
-    stored_orders = request.session.get("orders", [])
-    if not isinstance(stored_orders, list):
-        stored_orders = []
-    orders = list(stored_orders)[::-1]
+    _migrate_session_orders(request)
+    order_ids = _session_order_ids(request)
+    orders = []
+    if order_ids:
+        orders = (
+            Order.objects.filter(order_id__in=order_ids)
+            .annotate(item_count=Count("items"))
+            .order_by("-created_at")
+        )
     return render(request, "restaurant/orders.html", {"orders": orders})
 
 
+@query_budget(1)
 def contact(request):
     return render(request, "restaurant/contact.html")
 
 
+@query_budget(1)
 def payment_confirmation(request):
     return render(request, "restaurant/payment_confirmation.html")
 
 
+@query_budget(2)
 def otp_verification(request):
-    return render(request, "restaurant/otp_verification.html")
+    order = _pending_online_order(request)
+    otp = _order_otp(order) if order is not None else None
+    expires_in = 0
+    if otp is not None and not otp.is_locked:
+        expires_in = max(int((otp.expires_at - timezone.now()).total_seconds()), 0)
+    context = {
+        "otp": otp,
+        "expires_in": expires_in,
+        "max_attempts": otp.max_attempts if otp is not None else PaymentOTP._meta.get_field("max_attempts").default,
+    }
+    return render(request, "restaurant/otp_verification.html", context)
+
+
+@query_budget(11)
+@require_POST
+def payment_otp_issue(request):
+    pending = request.session.get("pending_order")
+    if not pending:
+        return JsonResponse({"success": False, "error": "No pending payment"}, status=400)
+    issued = pending.get("issued", 0)
+    if not isinstance(issued, int) or issued >= settings.PAYMENT_OTP_MAX_ISSUES:
+        return JsonResponse({"success": False, "error": "Too many codes requested. Please check out again."}, status=429)
+
+    lines = _cart_order_lines(request)
+    if not lines:
+        return JsonResponse({"success": False, "error": "Cart is empty"}, status=400)
+
+    order = _pending_online_order(request)
+    if order is None or order.status != Order.STATUS_AWAITING_PAYMENT:
+        customer = pending.get("customer") or {}
+        order = _create_order(
+            request,
+            customer,
+            pending.get("payment_method"),
+            status=Order.STATUS_AWAITING_PAYMENT,
+            payment_status="Pending",
+        )
+    elif not _order_matches_lines(order, lines):
+        # The cart changed after the order was created: charge for what is in it now.
+        order.replace_items(lines)
+    pending["order_id"] = order.order_id
+    pending["issued"] = issued + 1
+    request.session["pending_order"] = pending
+    request.session.modified = True
+
+    ttl = timedelta(seconds=settings.PAYMENT_OTP_TTL_SECONDS)
+    otp = PaymentOTP.objects.issue(order, ttl=ttl)
+    data = {
+        "success": True,
+        "expires_in": int(ttl.total_seconds()),
+        "attempts": otp.attempts,
+        "max_attempts": otp.max_attempts,
+    }
+    if settings.PAYMENT_OTP_DEMO:
+        data["otp"] = otp.otp_code
+    return JsonResponse(data)
+
+
+@query_budget(5)
+@require_POST
+def payment_otp_verify(request):
+    order = _pending_online_order(request)
+    if order is None:
+        return JsonResponse({"success": False, "error": "No pending payment"}, status=400)
 
+    if request.content_type == "application/json":
+        try:
+            data = json.loads(request.body.decode("utf-8") or "{}")
+        except json.JSONDecodeError:
+            data = {}
+        code = str(data.get("otp") or "")
+    else:
+        code = request.POST.get("otp") or ""
+
+    _updated, otp = PaymentOTP.objects.verify(order, code.strip())
+    if otp is None:
+        return JsonResponse({"success": False, "error": "OTP not issued"}, status=400)
+    if otp.is_verified:
+        return JsonResponse({"success": True, "redirect": reverse("restaurant:place_order")})
+
+    data = {"success": False, "attempts": otp.attempts, "max_attempts": otp.max_attempts}
+    if otp.is_locked:
+        Order.objects.filter(pk=order.pk, status=Order.STATUS_AWAITING_PAYMENT).update(status=Order.STATUS_PAYMENT_FAILED)
+        data.update({"error": "OTP expired or too many attempts.", "redirect": reverse("restaurant:payment_failed")})
+    else:
+        data["error"] = "Incorrect OTP. Please try again."
+    return JsonResponse(data)
 
+
+@query_budget(1)
 def payment_failed(request):
     return render(request, "restaurant/payment_failed.html")
 
 
+@query_budget(5)
 def place_order(request):
-    cart = _get_session_cart(request)
-    items, subtotal = _cart_items_with_totals(cart)
-    if not items:
+    order = _pending_online_order(request)
+    if order is None:
         return redirect("restaurant:cart")
 
-    pending = request.session.get("pending_order") or {}
-    customer = pending.get("customer") or {
-        "name": "",
-        "email": "",
-        "phone": "",
-        "address": "",
-        "instructions": "",
-    }
-    payment_method = pending.get("payment_method") or "COD"
+    otp = _order_otp(order)
+    if otp is None or not otp.is_verified:
+        return redirect("restaurant:otp_verification")
 
-    order_id = _create_session_order(request, customer, payment_method, is_online=True)
+    Order.objects.filter(pk=order.pk, status=Order.STATUS_AWAITING_PAYMENT).update(status="Pending", payment_status="Paid")
+    _remember_order(request, order.order_id)
     request.session.pop("pending_order", None)
     request.session.modified = True
-
-    if not order_id:
-        return redirect("restaurant:cart")
-    return redirect("restaurant:order_detail", order_id=order_id)
+    return redirect("restaurant:order_detail", order_id=order.order_id)
 
 
+@query_budget(10)
 def order_detail(request, order_id):
-    stored_orders = request.session.get("orders", [])
+    _migrate_session_orders(request)
     order = None
-    if isinstance(stored_orders, list):
-        for item in stored_orders:
-            if item.get("order_id") == order_id:
-                order = item
-                break
+    if order_id in _session_order_ids(request) or _is_admin(request.user):
+        try:
+            order = Order.objects.prefetch_related("items").get(order_id=order_id)
+        except Order.DoesNotExist:
+            order = None
     if not order:
         return render(request, "restaurant/order_not_found.html", {"order_id": order_id}, status=404)
-    return render(request, "restaurant/order_detail.html", {"order": order})
+    context = {"order": order, "items": order.items.all()}
+    return render(request, "restaurant/order_detail.html", context)
 
 
 def _is_admin(user):
     return user.is_staff or user.is_superuser
 
 
+def _encode_order_cursor(order):
+    created_at = order.created_at
+    micros = calendar.timegm(created_at.utctimetuple()) * 1000000 + created_at.microsecond
+    return f"{micros}-{order.pk}"
+
+
+def _decode_order_cursor(value):
+    try:
+        micros, pk = (int(part) for part in (value or "").split("-", 1))
+        seconds, micro = divmod(micros, 1000000)
+        created_at = datetime.fromtimestamp(seconds, tz=dt_timezone.utc).replace(microsecond=micro)
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+    return created_at, pk
+
+
+@query_budget(6)
 @login_required
 @user_passes_test(_is_admin)
 def admin_dashboard(request):
-    stored_orders = request.session.get("orders", [])
-    if not isinstance(stored_orders, list):
-        stored_orders = []
-
-    total_orders = len(stored_orders)
-    pending_orders = 0
-    total_revenue = Decimal("0.00")
-    for order in stored_orders:
-        status = order.get("status")
-        if status in ["Pending", "Placed"]:
-            pending_orders += 1
-        total_raw = order.get("total", 0)
-        try:
-            total_revenue += Decimal(str(total_raw))
-        except Exception:
-            continue
-
-    total_menu_items = MenuItem.objects.count()
-    orders = list(stored_orders)[::-1]
+    total_menu_items = len(_menu_snapshot(request).items)
+
+    # Reporting reads; staff who just changed an order are pinned to the primary.
+    with replica_reads():
+        placed = ~Q(status__in=Order.UNPLACED_STATUSES)
+        stats = Order.objects.aggregate(
+            total_orders=Count("id", filter=placed),
+            pending_orders=Count("id", filter=Q(status__in=["Pending", "Placed"])),
+            total_revenue=Sum("total", filter=placed),
+        )
+        total_orders = stats["total_orders"]
+        pending_orders = stats["pending_orders"]
+        total_revenue = stats["total_revenue"] or Decimal("0.00")
+
+        item_counts = (
+            OrderItem.objects.filter(order=OuterRef("pk"))
+            .order_by()
+            .values("order")
+            .annotate(count=Count("id"))
+            .values("count")
+        )
+        recent = Order.objects.filter(placed).annotate(item_count=Coalesce(Subquery(item_counts), 0)).order_by("-created_at", "-id")
+        cursor = _decode_order_cursor(request.GET.get("before"))
+        if cursor:
+            created_at, pk = cursor
+            recent = recent.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+        orders = list(recent[: DASHBOARD_PAGE_SIZE + 1])
+        next_cursor = None
+        if len(orders) > DASHBOARD_PAGE_SIZE:
+            orders = orders[:DASHBOARD_PAGE_SIZE]
+            next_cursor = _encode_order_cursor(orders[-1])
 
     context = {
         "total_orders": total_orders,
@@ -376,14 +370,18 @@ def admin_dashboard(request):
         "total_revenue": total_revenue,
         "total_menu_items": total_menu_items,
         "orders": orders,
+        "next_cursor": next_cursor,
+        "is_first_page": cursor is None,
     }
     return render(request, "restaurant/admin_dashboard.html", context)
 
 
+@query_budget(1)
 def choose_login(request):
     return render(request, "restaurant/choose_login.html")
 
 
+@query_budget(6)
 def customer_login(request):
     error = None
     if request.method == "POST":
@@ -397,6 +395,7 @@ def customer_login(request):
     return render(request, "restaurant/customer_login.html", {"error": error})
 
 
+@query_budget(6)
 def admin_login(request):
     error = None
     if request.method == "POST":
@@ -413,6 +412,27 @@ def admin_login(request):
     return render(request, "restaurant/admin_login.html", {"error": error})
 
 
+@query_budget(3)
+@login_required
+@user_passes_test(_is_admin)
+def menu_cache_stats_api(request):
+    return JsonResponse(menu_cache_stats())
+
+
+@query_budget(2)
+def request_metrics(request):
+    if not settings.REQUEST_METRICS:
+        raise Http404("Request metrics are disabled")
+    if settings.REQUEST_METRICS_TOKEN:
+        allowed = constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {settings.REQUEST_METRICS_TOKEN}")
+    else:
+        allowed = _is_admin(request.user)
+    if not allowed:
+        return HttpResponse(status=403)
+    return HttpResponse(metrics_registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@query_budget(3)
 @login_required
 @user_passes_test(_is_admin)
 def update_order_status(request, order_id, new_status):
@@ -420,60 +440,142 @@ def update_order_status(request, order_id, new_status):
     if new_status not in allowed_status:
         raise Http404("Invalid status")
 
-    stored_orders = request.session.get("orders", [])
-    if isinstance(stored_orders, list):
-        for order in stored_orders:
-            if order.get("order_id") == order_id:
-                order["status"] = new_status
-                break
-        request.session["orders"] = stored_orders
-        request.session.modified = True
+    # Orders still awaiting payment (or whose payment failed) were never placed.
+    unplaced = Order.objects.filter(order_id=order_id).exclude(status__in=Order.UNPLACED_STATUSES)
+    if unplaced.update(status=new_status):
+        publish_order_status(order_id, new_status)
 
     return redirect("restaurant:admin_dashboard")
 
 
+@query_budget(1)
+async def events(request):
+    # Server-Sent Events for this session: "cart" with the badge count and
+    # "order" when update_order_status changes one of its orders.
+    # 204 tells EventSource not to reconnect.
+    if not settings.ASYNC_VIEWS:
+        # Under WSGI each open stream would hold a worker thread.
+        return HttpResponse(status=204)
+    count = await asession_cart_count(request.session)
+    session_key = request.session.session_key
+    if session_key is None:
+        # No session yet; main.js reconnects after the first cart change.
+        return HttpResponse(status=204)
+
+    order_ids = await request.session.aget("order_ids", [])
+    if not isinstance(order_ids, list):
+        order_ids = []
+    channels = [session_channel(session_key), *(order_channel(order_id) for order_id in order_ids)]
+    response = StreamingHttpResponse(
+        event_stream(channels, initial=[("cart", {"cart_count": count})]), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@query_budget(1)
 def cart_count_api(request):
-    cart = _get_session_cart(request)
-    count = _cart_total_count(cart)
-    return JsonResponse({"cart_count": count})
+    return JsonResponse({"cart_count": session_cart_count(request.session)})
+
+
+@query_budget(1)
+async def acart_count_api(request):
+    return JsonResponse({"cart_count": await asession_cart_count(request.session)})
+
+
+def _menu_snapshot(request):
+    snapshot = getattr(request, "_menu_snapshot", None)
+    if snapshot is None:
+        snapshot = get_menu_snapshot()
+        request._menu_snapshot = snapshot
+    return snapshot
+
+
+async def _amenu_snapshot(request):
+    snapshot = getattr(request, "_menu_snapshot", None)
+    if snapshot is None:
+        snapshot = await aget_menu_snapshot()
+        request._menu_snapshot = snapshot
+    return snapshot
+
+
+def _checked_cart(stored, saved_version, snapshot):
+    # Returns the cart and whether it has to be written back to the session.
+    if not isinstance(stored, dict):
+        stored = {}
+
+    cart = {}
+    for key, value in stored.items():
+        quantity = cart_quantity(value)
+        if quantity > 0:
+            cart[str(key)] = quantity
+
+    if saved_version == snapshot.version:
+        return cart, False
+    cart = {
+        key: quantity
+        for key, quantity in cart.items()
+        if key.isdigit() and snapshot.get_available(int(key)) is not None
+    }
+    return cart, cart != stored or saved_version is not None
 
 
 def _get_session_cart(request):
-    cart = request.session.get("cart", {})
-    if not isinstance(cart, dict):
-        cart = {}
+    session = request.session
+    cart, changed = _checked_cart(session.get("cart", {}), session.get("cart_menu_version"), _menu_snapshot(request))
+    if changed:
+        _save_session_cart(request, cart)
     return cart
 
 
-def _save_session_cart(request, cart):
+async def _aget_session_cart(request):
+    session = request.session
+    cart, changed = _checked_cart(
+        await session.aget("cart", {}), await session.aget("cart_menu_version"), await _amenu_snapshot(request)
+    )
+    if changed:
+        await _asave_session_cart(request, cart)
+    return cart
+
+
+def _save_session_cart(request, cart, count=None):
+    if count is None:
+        count = count_cart_items(cart)
     request.session["cart"] = cart
+    request.session["cart_count"] = count
+    request.session["cart_menu_version"] = _menu_snapshot(request).version
     request.session.modified = True
+    publish_cart_count(request.session, count)
 
 
-def _cart_items_with_totals(cart):
+async def _asave_session_cart(request, cart, count=None):
+    if count is None:
+        count = count_cart_items(cart)
+    await request.session.aupdate(
+        {"cart": cart, "cart_count": count, "cart_menu_version": (await _amenu_snapshot(request)).version}
+    )
+    publish_cart_count(request.session, count)
+
+
+def _cart_items_with_totals(cart, snapshot):
     items = []
     subtotal = Decimal("0.00")
-    for key, value in cart.items():
-        try:
-            quantity = int(value.get("quantity", 0))
-        except (AttributeError, TypeError, ValueError):
-            quantity = 0
-        if quantity <= 0:
+    for key, quantity in cart.items():
+        if quantity <= 0 or not key.isdigit():
             continue
-        price_raw = value.get("price", 0)
-        try:
-            price = Decimal(str(price_raw))
-        except Exception:
-            price = Decimal("0.00")
-        line_total = price * quantity
+        menu_item = snapshot.get_available(int(key))
+        if menu_item is None:
+            continue
+        line_total = menu_item.price * quantity
         items.append(
             {
-                "id": value.get("id") or key,
-                "name": value.get("name", ""),
-                "category": value.get("category", ""),
-                "price": price,
+                "id": menu_item.id,
+                "name": menu_item.name,
+                "category": menu_item.category,
+                "price": menu_item.price,
                 "quantity": quantity,
-                "image_url": value.get("image_url", ""),
+                "image_url": menu_item.image_url,
                 "line_total": line_total,
             }
         )
@@ -481,66 +583,175 @@ def _cart_items_with_totals(cart):
     return items, subtotal
 
 
-def _cart_total_count(cart):
-    total = 0
-    for value in cart.values():
-        try:
-            quantity = int(value.get("quantity", 0))
-        except (AttributeError, TypeError, ValueError):
-            quantity = 0
-        if quantity > 0:
-            total += quantity
-    return total
+def _session_order_ids(request):
+    order_ids = request.session.get("order_ids", [])
+    if not isinstance(order_ids, list):
+        order_ids = []
+    return order_ids
 
 
-def _create_session_order(request, customer, payment_method, is_online):
-    cart = _get_session_cart(request)
-    items, subtotal = _cart_items_with_totals(cart)
-    if not items:
+def _cart_order_lines(request):
+    items, _subtotal = _cart_items_with_totals(_get_session_cart(request), _menu_snapshot(request))
+    return [
+        {
+            "menu_item_id": item["id"],
+            "name": item["name"],
+            "category": item["category"],
+            "price": item["price"],
+            "quantity": item["quantity"],
+        }
+        for item in items
+    ]
+
+
+def _order_matches_lines(order, lines):
+    ordered = sorted(order.items.values_list("menu_item_id", "price", "quantity"))
+    return ordered == sorted((line["menu_item_id"], line["price"], line["quantity"]) for line in lines)
+
+
+def _create_order(request, customer, payment_method, status="Pending", payment_status="COD"):
+    lines = _cart_order_lines(request)
+    if not lines:
         return None
 
-    delivery_fee = Decimal("30.00") if subtotal > 0 else Decimal("0.00")
-    total = subtotal + delivery_fee
+    if payment_method not in dict(Order.PAYMENT_METHOD_CHOICES):
+        payment_method = Order.PAYMENT_METHOD_COD
+
+    return Order.objects.create_with_items(
+        lines,
+        customer_name=customer.get("name", ""),
+        customer_email=customer.get("email", ""),
+        customer_phone=customer.get("phone", ""),
+        address=customer.get("address", ""),
+        instructions=customer.get("instructions", ""),
+        payment_method=payment_method,
+        payment_status=payment_status,
+        status=status,
+    )
+
+
+def _remember_order(request, order_id):
+    order_ids = _session_order_ids(request)
+    order_ids.append(order_id)
+    request.session["order_ids"] = order_ids[-SESSION_ORDER_HISTORY_LIMIT:]
+    _save_session_cart(request, {}, count=0)
+
+
+def _migrate_session_orders(request):
+    # Sessions from before orders were stored in the database keep them as
+    # dicts under "orders". Copy them into Order rows once, so the order pages
+    # (which only read Order rows) keep showing them.
+    stored = request.session.get("orders")
+    if stored is None:
+        return
+    entries = {}
+    for entry in stored if isinstance(stored, list) else []:
+        if isinstance(entry, dict) and entry.get("order_id"):
+            entries[str(entry["order_id"])[:20]] = entry
 
-    order_id = "ORD" + str(int(time.time() * 1000))
+    if entries:
+        with transaction.atomic():
+            existing = set(Order.objects.filter(order_id__in=entries).values_list("order_id", flat=True))
+            new = {order_id: entry for order_id, entry in entries.items() if order_id not in existing}
+            if new:
+                _create_legacy_orders(new)
 
-    order_items = []
-    for item in items:
-        order_items.append(
-            {
-                "id": item["id"],
-                "name": item["name"],
-                "category": item["category"],
-                "price": float(item["price"]),
-                "quantity": item["quantity"],
-                "image_url": item["image_url"],
-                "line_total": float(item["line_total"]),
-            }
+    order_ids = list(entries) + [order_id for order_id in _session_order_ids(request) if order_id not in entries]
+    request.session["order_ids"] = order_ids[-SESSION_ORDER_HISTORY_LIMIT:]
+    del request.session["orders"]
+
+
+def _legacy_decimal(value):
+    try:
+        return Decimal(str(value)).quantize(Decimal("0.01"))
+    except (ArithmeticError, ValueError):
+        return Decimal("0.00")
+
+
+def _legacy_created_at(value):
+    try:
+        return timezone.make_aware(datetime.strptime(str(value), "%Y-%m-%d %H:%M"))
+    except ValueError:
+        return None
+
+
+def _create_legacy_orders(entries):
+    lines = {}
+    menu_item_ids = set()
+    for order_id, entry in entries.items():
+        lines[order_id] = []
+        for item in entry.get("items") or []:
+            if not isinstance(item, dict):
+                continue
+            price = _legacy_decimal(item.get("price"))
+            quantity = max(cart_quantity(item.get("quantity")), 0)
+            line = OrderItem(
+                menu_item_id=item.get("id") if isinstance(item.get("id"), int) else None,
+                name=str(item.get("name") or "")[:200],
+                category=str(item.get("category") or "")[:50],
+                price=price,
+                quantity=quantity,
+                line_total=price * quantity,
+            )
+            menu_item_ids.add(line.menu_item_id)
+            lines[order_id].append(line)
+    # The menu item may have been deleted since; keep the line without the link.
+    menu_item_ids = set(MenuItem.objects.filter(pk__in=menu_item_ids - {None}).values_list("pk", flat=True))
+
+    orders = []
+    for order_id, entry in entries.items():
+        customer = entry.get("customer") if isinstance(entry.get("customer"), dict) else {}
+        subtotal = sum((line.line_total for line in lines[order_id]), Decimal("0.00"))
+        delivery_fee = _legacy_decimal(entry.get("delivery_fee"))
+        payment_method = entry.get("payment_method")
+        if payment_method not in dict(Order.PAYMENT_METHOD_CHOICES):
+            payment_method = Order.PAYMENT_METHOD_COD
+        orders.append(
+            Order(
+                order_id=order_id,
+                customer_name=str(customer.get("name") or "")[:200],
+                customer_email=str(customer.get("email") or "")[:254],
+                customer_phone=str(customer.get("phone") or "")[:20],
+                address=str(customer.get("address") or ""),
+                instructions=str(customer.get("instructions") or ""),
+                payment_method=payment_method,
+                payment_status=str(entry.get("payment_status") or "Pending")[:20],
+                status=str(entry.get("status") or "Pending")[:20],
+                subtotal=subtotal,
+                delivery_fee=delivery_fee,
+                total=subtotal + delivery_fee,
+            )
         )
+    Order.objects.bulk_create(orders)
 
-    orders = request.session.get("orders", [])
-    if not isinstance(orders, list):
-        orders = []
-
-    order = {
-        "order_id": order_id,
-        "items": order_items,
-        "subtotal": float(subtotal),
-        "delivery_fee": float(delivery_fee),
-        "total": float(total),
-        "created_at": time.strftime("%Y-%m-%d %H:%M"),
-        "status": "Pending",
-        "payment_method": payment_method,
-        "payment_status": "Paid" if is_online and payment_method != "COD" else ("COD" if payment_method == "COD" else "Pending"),
-        "customer": customer,
-    }
+    pks = dict(Order.objects.filter(order_id__in=entries).values_list("order_id", "pk"))
+    items = []
+    for order in orders:
+        order.pk = pks[order.order_id]
+        # auto_now_add stamped the orders with the current time.
+        order.created_at = _legacy_created_at(entries[order.order_id].get("created_at")) or order.created_at
+        for line in lines[order.order_id]:
+            line.order_id = order.pk
+            if line.menu_item_id not in menu_item_ids:
+                line.menu_item_id = None
+            items.append(line)
+    OrderItem.objects.bulk_create(items)
+    Order.objects.bulk_update(orders, ["created_at"])
+
+
+def _pending_online_order(request):
+    pending = request.session.get("pending_order") or {}
+    order_id = pending.get("order_id")
+    if not order_id:
+        return None
+    return Order.objects.select_related("payment_otp").filter(order_id=order_id).first()
 
-    orders.append(order)
-    request.session["orders"] = orders
-    request.session["cart"] = {}
-    request.session.modified = True
 
-    return order_id
+def _order_otp(order):
+    try:
+        return order.payment_otp
+    except PaymentOTP.DoesNotExist:
+        return None
 
 
 def _parse_item_id(request):
@@ -553,119 +764,191 @@ def _parse_item_id(request):
     return request.POST.get("item_id")
 
 
-@csrf_exempt
-@require_POST
-def cart_increase(request):
+def _cart_error(request, error, status):
+    if request.content_type == "application/json":
+        return JsonResponse({"success": False, "error": error}, status=status)
+    return redirect("restaurant:cart")
+
+
+def _cart_result(request, quantity, total_count):
+    if request.content_type == "application/json":
+        return JsonResponse({"success": True, "quantity": quantity, "cart_count": total_count})
+    return redirect("restaurant:cart")
+
+
+def _change_cart(action, cart, count, item_pk, snapshot):
+    # Shared by the sync and async cart views. Returns (quantity, total count,
+    # whether to save), or None for an item that is not on the menu.
+    key = str(item_pk)
+    if action == "increase":
+        if key not in cart and snapshot.get_available(item_pk) is None:
+            return None
+        if cart.get(key, 0) >= CART_MAX_ITEM_QUANTITY:
+            return cart[key], count, False
+        cart[key] = cart.get(key, 0) + 1
+        return cart[key], count + 1, True
+
+    if action == "decrease":
+        if key not in cart:
+            return 0, count, False
+        quantity = cart[key] - 1
+        if quantity <= 0:
+            cart.pop(key, None)
+            quantity = 0
+        else:
+            cart[key] = quantity
+        return quantity, max(count - 1, 0), True
+
+    removed = cart.pop(key, 0)
+    return 0, max(count - removed, 0), True
+
+
+def _update_cart(request, action):
     item_id = _parse_item_id(request)
     if not item_id:
-        if request.content_type == "application/json":
-            return JsonResponse({"success": False, "error": "Missing item_id"}, status=400)
-        return redirect("restaurant:cart")
+        return _cart_error(request, "Missing item_id", 400)
 
     cart = _get_session_cart(request)
     try:
         item_pk = int(item_id)
     except (TypeError, ValueError):
-        if request.content_type == "application/json":
-            return JsonResponse({"success": False, "error": "Invalid item_id"}, status=400)
-        return redirect("restaurant:cart")
+        return _cart_error(request, "Invalid item_id", 400)
 
-    key = str(item_pk)
-    data = cart.get(key)
-    if data is None:
-        try:
-            menu_item = MenuItem.objects.get(id=item_pk, is_available=True)
-        except MenuItem.DoesNotExist:
-            if request.content_type == "application/json":
-                return JsonResponse({"success": False, "error": "Item not found"}, status=404)
-            return redirect("restaurant:cart")
-        data = {
-            "id": menu_item.id,
-            "name": menu_item.name,
-            "category": menu_item.category,
-            "price": float(menu_item.price),
-            "quantity": 0,
-            "image_url": menu_item.image_url or "",
-        }
+    change = _change_cart(action, cart, session_cart_count(request.session), item_pk, _menu_snapshot(request))
+    if change is None:
+        return _cart_error(request, "Item not found", 404)
+    quantity, total_count, save = change
+    if save:
+        _save_session_cart(request, cart, count=total_count)
+    return _cart_result(request, quantity, total_count)
+
+
+async def _aupdate_cart(request, action):
+    item_id = _parse_item_id(request)
+    if not item_id:
+        return _cart_error(request, "Missing item_id", 400)
 
+    cart = await _aget_session_cart(request)
     try:
-        quantity = int(data.get("quantity", 0)) + 1
+        item_pk = int(item_id)
     except (TypeError, ValueError):
-        quantity = 1
+        return _cart_error(request, "Invalid item_id", 400)
 
-    data["quantity"] = quantity
-    cart[key] = data
-    _save_session_cart(request, cart)
-    total_count = _cart_total_count(cart)
-    if request.content_type == "application/json":
-        return JsonResponse({"success": True, "quantity": quantity, "cart_count": total_count})
-    return redirect("restaurant:cart")
+    count = await asession_cart_count(request.session)
+    change = _change_cart(action, cart, count, item_pk, await _amenu_snapshot(request))
+    if change is None:
+        return _cart_error(request, "Item not found", 404)
+    quantity, total_count, save = change
+    if save:
+        await _asave_session_cart(request, cart, count=total_count)
+    return _cart_result(request, quantity, total_count)
 
 
+@query_budget(3)
 @csrf_exempt
 @require_POST
-def cart_decrease(request):
-    item_id = _parse_item_id(request)
-    if not item_id:
-        if request.content_type == "application/json":
-            return JsonResponse({"success": False, "error": "Missing item_id"}, status=400)
-        return redirect("restaurant:cart")
+def cart_increase(request):
+    return _update_cart(request, "increase")
 
-    cart = _get_session_cart(request)
-    try:
-        item_pk = int(item_id)
-    except (TypeError, ValueError):
-        if request.content_type == "application/json":
-            return JsonResponse({"success": False, "error": "Invalid item_id"}, status=400)
-        return redirect("restaurant:cart")
 
-    key = str(item_pk)
-    data = cart.get(key)
-    if data is None:
-        if request.content_type == "application/json":
-            return JsonResponse({"success": True, "quantity": 0, "cart_count": _cart_total_count(cart)})
-        return redirect("restaurant:cart")
+@query_budget(3)
+@csrf_exempt
+@require_POST
+async def acart_increase(request):
+    return await _aupdate_cart(request, "increase")
 
-    try:
-        quantity = int(data.get("quantity", 0)) - 1
-    except (TypeError, ValueError):
-        quantity = 0
 
-    if quantity <= 0:
-        cart.pop(key, None)
-        quantity = 0
-    else:
-        data["quantity"] = quantity
-        cart[key] = data
+@query_budget(3)
+@csrf_exempt
+@require_POST
+def cart_decrease(request):
+    return _update_cart(request, "decrease")
 
-    _save_session_cart(request, cart)
-    total_count = _cart_total_count(cart)
-    if request.content_type == "application/json":
-        return JsonResponse({"success": True, "quantity": quantity, "cart_count": total_count})
-    return redirect("restaurant:cart")
 
+@query_budget(3)
+@csrf_exempt
+@require_POST
+async def acart_decrease(request):
+    return await _aupdate_cart(request, "decrease")
 
+
+@query_budget(3)
 @csrf_exempt
 @require_POST
 def cart_remove(request):
-    item_id = _parse_item_id(request)
-    if not item_id:
-        if request.content_type == "application/json":
-            return JsonResponse({"success": False, "error": "Missing item_id"}, status=400)
-        return redirect("restaurant:cart")
+    return _update_cart(request, "remove")
 
-    cart = _get_session_cart(request)
+
+@query_budget(3)
+@csrf_exempt
+@require_POST
+async def acart_remove(request):
+    return await _aupdate_cart(request, "remove")
+
+
+@query_budget(3)
+@csrf_exempt
+@require_POST
+def cart_apply(request):
     try:
+        data = json.loads(request.body.decode("utf-8") or "{}")
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return JsonResponse({"success": False, "error": "Invalid JSON"}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({"success": False, "error": "Invalid JSON"}, status=400)
+
+    operations = data.get("operations")
+    if not isinstance(operations, list) or not operations:
+        return JsonResponse({"success": False, "error": "Missing operations"}, status=400)
+    if len(operations) > CART_APPLY_MAX_OPERATIONS:
+        return JsonResponse({"success": False, "error": "Too many operations"}, status=400)
+
+    idempotency_key = data.get("idempotency_key")
+    if idempotency_key is not None:
+        idempotency_key = str(idempotency_key)[:64]
+        applied = request.session.get("cart_applied", {})
+        if isinstance(applied, dict) and idempotency_key in applied:
+            return JsonResponse(applied[idempotency_key])
+
+    cart = _get_session_cart(request)
+    snapshot = _menu_snapshot(request)
+    total_count = session_cart_count(request.session)
+    touched = {}
+    rejected = []
+    for operation in operations:
+        item_id = operation.get("item_id") if isinstance(operation, dict) else None
+        delta = operation.get("delta", 0) if isinstance(operation, dict) else None
+        # Plain integers only: JSON true and 1.7 would otherwise pass through int().
+        if type(delta) is not int or type(item_id) not in (int, str) or not str(item_id).isdecimal():
+            rejected.append({"operation": operation, "error": "Invalid operation"})
+            continue
+
         item_pk = int(item_id)
-    except (TypeError, ValueError):
-        if request.content_type == "application/json":
-            return JsonResponse({"success": False, "error": "Invalid item_id"}, status=400)
-        return redirect("restaurant:cart")
+        key = str(item_pk)
+        current = cart.get(key, 0)
+        if operation.get("remove"):
+            delta = -current
+        if delta > 0 and key not in cart and snapshot.get_available(item_pk) is None:
+            rejected.append({"item_id": item_pk, "error": "Item not found"})
+            continue
 
-    key = str(item_pk)
-    cart.pop(key, None)
-    _save_session_cart(request, cart)
-    total_count = _cart_total_count(cart)
-    if request.content_type == "application/json":
-        return JsonResponse({"success": True, "quantity": 0, "cart_count": total_count})
-    return redirect("restaurant:cart")
+        quantity = max(current + delta, 0)
+        if quantity > CART_MAX_ITEM_QUANTITY:
+            rejected.append({"item_id": item_pk, "error": f"At most {CART_MAX_ITEM_QUANTITY} per item"})
+            quantity = CART_MAX_ITEM_QUANTITY
+        if quantity:
+            cart[key] = quantity
+        else:
+            cart.pop(key, None)
+        total_count += quantity - current
+        touched[key] = quantity
+
+    _save_session_cart(request, cart, count=max(total_count, 0))
+    result = {"success": True, "items": touched, "rejected": rejected, "cart_count": request.session["cart_count"]}
+    if idempotency_key is not None:
+        applied = request.session.get("cart_applied", {})
+        if not isinstance(applied, dict):
+            applied = {}
+        applied[idempotency_key] = result
+        request.session["cart_applied"] = dict(list(applied.items())[-CART_APPLY_REMEMBERED_KEYS:])
+    return JsonResponse(result)
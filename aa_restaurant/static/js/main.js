@@ -93,6 +93,175 @@ function updateCartBadge() {
         });
 }
 
+function setCartBadgeCount(count) {
+    var badge = document.getElementById("cartCountBadge");
+    if (!badge) {
+        return;
+    }
+    if (count <= 0) {
+        badge.textContent = "0";
+        badge.classList.add("d-none");
+    } else {
+        badge.textContent = String(count);
+        badge.classList.remove("d-none");
+    }
+}
+
+var ORDER_STATUS_CLASSES = {
+    Delivered: { badge: ["bg-success"], card: "delivered" },
+    Preparing: { badge: ["bg-warning", "text-dark"], card: "preparing" },
+    Pending: { badge: ["bg-secondary"], card: "pending" }
+};
+var eventSource = null;
+
+function pendingCartDelta() {
+    var delta = 0;
+    for (var itemId in pendingCartChanges) {
+        if (Object.prototype.hasOwnProperty.call(pendingCartChanges, itemId)) {
+            delta += pendingCartChanges[itemId];
+        }
+    }
+    return delta;
+}
+
+function showOrderStatus(orderId, status) {
+    var classes = ORDER_STATUS_CLASSES[status] || ORDER_STATUS_CLASSES.Pending;
+    var badges = document.querySelectorAll("[data-order-status]");
+    for (var i = 0; i < badges.length; i++) {
+        if (badges[i].getAttribute("data-order-status") !== orderId) {
+            continue;
+        }
+        badges[i].classList.remove("bg-success", "bg-warning", "text-dark", "bg-secondary");
+        badges[i].classList.add.apply(badges[i].classList, classes.badge);
+        badges[i].textContent = status;
+    }
+    var cards = document.querySelectorAll("[data-order-card]");
+    for (var j = 0; j < cards.length; j++) {
+        if (cards[j].getAttribute("data-order-card") !== orderId) {
+            continue;
+        }
+        cards[j].classList.remove("delivered", "preparing", "pending");
+        cards[j].classList.add(classes.card);
+    }
+}
+
+function connectEvents() {
+    var badge = document.getElementById("cartCountBadge");
+    var url = badge ? badge.getAttribute("data-events-url") : null;
+    if (!url || typeof window.EventSource === "undefined") {
+        updateCartBadge();
+        return;
+    }
+    if (eventSource && eventSource.readyState !== EventSource.CLOSED) {
+        return;
+    }
+
+    eventSource = new EventSource(url, { withCredentials: true });
+    eventSource.addEventListener("cart", function (event) {
+        var data = safeParseJson(event.data, {});
+        if (typeof data.cart_count === "number") {
+            // Changes still waiting in the apply queue are not on the server yet.
+            setCartBadgeCount(Math.max(data.cart_count + pendingCartDelta(), 0));
+        }
+    });
+    eventSource.addEventListener("order", function (event) {
+        var data = safeParseJson(event.data, {});
+        if (data.order_id && data.status) {
+            showOrderStatus(data.order_id, data.status);
+        }
+    });
+    eventSource.addEventListener("error", function () {
+        // CLOSED: the server answered 204 because there is no session yet.
+        // Otherwise EventSource reconnects on its own.
+        if (eventSource.readyState === EventSource.CLOSED) {
+            updateCartBadge();
+        }
+    });
+}
+
+var CART_APPLY_DELAY_MS = 300;
+var pendingCartChanges = {};
+var cartApplyTimer = null;
+
+function newIdempotencyKey() {
+    if (window.crypto && typeof window.crypto.randomUUID === "function") {
+        return window.crypto.randomUUID();
+    }
+    return String(Date.now()) + "-" + Math.random().toString(36).slice(2);
+}
+
+function sendCartChanges(url, body, retriesLeft) {
+    return fetch(url, {
+        method: "POST",
+        headers: {
+            "Content-Type": "application/json"
+        },
+        credentials: "same-origin",
+        keepalive: true,
+        body: JSON.stringify(body)
+    })
+        .then(function (response) {
+            if (!response.ok) {
+                throw new Error("Network response was not ok");
+            }
+            return response.json();
+        })
+        .then(function (data) {
+            if (data && typeof data.cart_count === "number") {
+                setCartBadgeCount(data.cart_count);
+            }
+            // The first cart change creates the session, so there is now a stream to open.
+            connectEvents();
+            return data;
+        })
+        .catch(function () {
+            if (retriesLeft > 0) {
+                return sendCartChanges(url, body, retriesLeft - 1);
+            }
+            updateCartBadge();
+        });
+}
+
+function flushCartChanges() {
+    if (cartApplyTimer) {
+        clearTimeout(cartApplyTimer);
+        cartApplyTimer = null;
+    }
+    var badge = document.getElementById("cartCountBadge");
+    var url = badge ? badge.getAttribute("data-cart-apply-url") : null;
+
+    var operations = [];
+    for (var itemId in pendingCartChanges) {
+        if (Object.prototype.hasOwnProperty.call(pendingCartChanges, itemId) && pendingCartChanges[itemId] !== 0) {
+            operations.push({ item_id: itemId, delta: pendingCartChanges[itemId] });
+        }
+    }
+    pendingCartChanges = {};
+    if (!url || operations.length === 0) {
+        return;
+    }
+
+    sendCartChanges(url, { operations: operations, idempotency_key: newIdempotencyKey() }, 1);
+}
+
+function queueCartChange(itemId, delta) {
+    if (!itemId || !delta) {
+        return;
+    }
+    pendingCartChanges[itemId] = (pendingCartChanges[itemId] || 0) + delta;
+
+    var badge = document.getElementById("cartCountBadge");
+    if (badge) {
+        var current = parseInt(badge.textContent, 10) || 0;
+        setCartBadgeCount(Math.max(current + delta, 0));
+    }
+
+    if (cartApplyTimer) {
+        clearTimeout(cartApplyTimer);
+    }
+    cartApplyTimer = setTimeout(flushCartChanges, CART_APPLY_DELAY_MS);
+}
+
 function getCurrentUser() {
     var raw = localStorage.getItem("aaCurrentUser");
     return safeParseJson(raw, null);
@@ -198,9 +367,16 @@ function handleLogout() {
     updateNavbarAuth();
 }
 
+window.addEventListener("pagehide", flushCartChanges);
+window.addEventListener("pageshow", function (event) {
+    if (event.persisted) {
+        connectEvents();
+    }
+});
+
 document.addEventListener("DOMContentLoaded", function () {
     updateNavbarAuth();
-    updateCartBadge();
+    connectEvents();
 
     var loginButton = document.getElementById("loginSubmitButton");
     if (loginButton) {
@@ -230,6 +406,8 @@ document.addEventListener("DOMContentLoaded", function () {
 window.getCart = getCart;
 window.saveCart = saveCart;
 window.updateCartBadge = updateCartBadge;
+window.queueCartChange = queueCartChange;
+window.flushCartChanges = flushCartChanges;
 window.getOrders = getOrders;
 window.saveOrders = saveOrders;
 window.showLoginModal = showLoginModal;